@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from up_goer.ahrs.ahrs import MadgwickAHRS, MadgwickAHRSBank
+
+SAMPLE_PERIOD = 0.1
+BETA = 2.5
+TAGS = 4
+STEPS = 200
+
+
+def readings(seed: int = 0) -> np.ndarray:
+    """(STEPS, TAGS, 9) readings, with some zero accelerometer and magnetometer rows"""
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(STEPS, TAGS, 9))
+    data[:, :, 3:6] += [0.0, 0.0, 1.0]
+    data[:, :, 6:9] += [20.0, 0.0, 45.0]
+    data[::7, 1, 3:6] = 0.0
+    data[::11, 2, 6:9] = 0.0
+    data[5, :, 3:9] = 0.0
+    return data
+
+
+def scalar_filters() -> list[MadgwickAHRS]:
+    return [MadgwickAHRS(SAMPLE_PERIOD, BETA) for _ in range(TAGS)]
+
+
+def test_update_matches_scalar():
+    data = readings()
+    filters = scalar_filters()
+    bank = MadgwickAHRSBank(SAMPLE_PERIOD, BETA, TAGS)
+    for step in data:
+        for ahrs, row in zip(filters, step.tolist()):
+            ahrs.update(*row)
+        bank.update(step)
+        expected = [ahrs.quaternion for ahrs in filters]
+        np.testing.assert_allclose(bank.quaternions, expected, rtol=0, atol=1e-12)
+
+
+def test_update_at_matches_scalar():
+    data = readings(1)
+    rng = np.random.default_rng(1)
+    # Uneven steps, with gaps longer than max_dt and repeated timestamps
+    times = np.cumsum(rng.choice([0.0, 0.05, 0.1, 0.2, 1.0], size=(STEPS, TAGS)), 0)
+    filters = scalar_filters()
+    bank = MadgwickAHRSBank(SAMPLE_PERIOD, BETA, TAGS)
+    for step, timestamps in zip(data, times):
+        for ahrs, row, timestamp in zip(filters, step.tolist(), timestamps.tolist()):
+            ahrs.update_at(timestamp, *row)
+        bank.update_at(step, timestamps)
+        expected = [ahrs.quaternion for ahrs in filters]
+        np.testing.assert_allclose(bank.quaternions, expected, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("rows", [[0], [3, 1], [2, 0, 3]])
+def test_update_rows_matches_scalar(rows: list[int]):
+    data = readings(2)
+    index = np.array(rows)
+    filters = scalar_filters()
+    bank = MadgwickAHRSBank(SAMPLE_PERIOD, BETA, TAGS)
+    for step in data:
+        for row in rows:
+            filters[row].update(*step[row].tolist())
+        bank.update(step[index], index)
+    expected = [ahrs.quaternion for ahrs in filters]
+    np.testing.assert_allclose(bank.quaternions, expected, rtol=0, atol=1e-12)
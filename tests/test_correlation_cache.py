@@ -0,0 +1,53 @@
+from up_goer.server_logger.server_logger import CorrelationCache
+
+
+def test_hit_returns_trace_and_round_trip():
+    cache = CorrelationCache(stale_after=2.0)
+    cache.put("a", 10.0, [9.0, 9.5, 9.75, 9.9])
+    assert cache.resolve("a", 10.5) == ("hit", [9.0, 9.5, 9.75, 9.9])
+    assert cache.summary()["rtt"]["count"] == 1
+    assert len(cache) == 0
+
+
+def test_unknown_and_repeated_ids_miss():
+    cache = CorrelationCache()
+    cache.put("a", 10.0)
+    assert cache.resolve("b", 10.1) == ("miss", None)
+    assert cache.resolve("a", 10.1)[0] == "hit"
+    assert cache.resolve("a", 10.2) == ("miss", None)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_late_predictions_expire():
+    cache = CorrelationCache(stale_after=2.0)
+    cache.put("a", 10.0, [9.0])
+    cache.put("b", 10.0)
+    assert cache.resolve("a", 12.5) == ("expired", [9.0])
+    # Exactly stale_after is still in time
+    assert cache.resolve("b", 12.0)[0] == "hit"
+    assert (cache.hits, cache.expired) == (1, 1)
+
+
+def test_oldest_evicted_past_max_size():
+    cache = CorrelationCache(max_size=2)
+    for i, id in enumerate("abc"):
+        cache.put(id, 10.0 + i)
+    assert len(cache) == 2
+    assert cache.lost == 1
+    assert cache.resolve("a", 13.0) == ("miss", None)
+    assert cache.resolve("c", 13.0)[0] == "hit"
+
+
+def test_entries_older_than_max_age_are_lost():
+    cache = CorrelationCache(max_age=30.0)
+    cache.put("a", 0.0)
+    cache.put("b", 20.0)
+    cache.evict(30.0)
+    assert cache.lost == 0
+    # Putting newer data evicts by its time too
+    cache.put("c", 45.0)
+    assert cache.lost == 1
+    assert list(cache.entries) == ["b", "c"]
+    cache.evict(100.0)
+    assert cache.lost == 3
+    assert cache.summary()["pending"] == 0
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from up_goer.ahrs.ahrs import wrap_degrees
+from up_goer.features.features import FeatureStage, SlidingWindow
+
+COLUMNS = 6
+STEPS = 300
+
+
+def angles(seed: int = 0) -> np.ndarray:
+    """(STEPS, COLUMNS) angles in degrees wandering across the +-180 seam"""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(scale=15.0, size=(STEPS, COLUMNS))
+    steps[100:110] = 0.0
+    return wrap_degrees(170.0 + np.cumsum(steps, axis=0))
+
+
+def unwrapped(rows: np.ndarray) -> np.ndarray:
+    jumps = wrap_degrees(np.diff(rows, axis=0))
+    return np.vstack([rows[:1], rows[:1] + np.cumsum(jumps, axis=0)])
+
+
+@pytest.mark.parametrize("size", [1, 7, 50])
+def test_window_matches_recompute(size: int):
+    rows = angles()
+    expected_rows = unwrapped(rows)
+    window = SlidingWindow(size, COLUMNS)
+    for step, row in enumerate(rows):
+        window.add(row, step * 0.1)
+        expected = expected_rows[max(step + 1 - size, 0) : step + 1]
+        assert len(window) == len(expected)
+        np.testing.assert_allclose(window.mean, expected.mean(axis=0), atol=1e-9)
+        np.testing.assert_allclose(window.variance, expected.var(axis=0), atol=1e-6)
+        np.testing.assert_allclose(window.minimum, expected.min(axis=0), atol=1e-9)
+        np.testing.assert_allclose(window.maximum, expected.max(axis=0), atol=1e-9)
+        assert window.seconds == pytest.approx((len(expected) - 1) * 0.1)
+
+
+def test_constant_columns_have_no_variance():
+    window = SlidingWindow(5, 2)
+    for step in range(20):
+        window.add([0.1, -179.9], step)
+    assert (window.variance >= 0.0).all()
+    np.testing.assert_allclose(window.variance, 0.0, atol=1e-9)
+
+
+def test_stage_publishes_every_interval():
+    stage = FeatureStage(size=10, interval=1.0)
+    due = [stage.add(np.zeros((3, 3)), step * 0.25) for step in range(9)]
+    assert due == [False, False, False, False, True, False, False, False, True]
+
+
+def test_stage_features_wrap_across_the_seam():
+    stage = FeatureStage(size=4, interval=0.0)
+    for yaws in [[179.0, 10.0], [-179.0, 12.0]]:
+        stage.add(np.array([[0.0, 0.0, yaws[0]], [0.0, 0.0, yaws[1]]]), 0.0)
+    features = stage.features()
+    # mean, variance, min and max of each column, then yaws relative to the first
+    assert len(features) == 2 * 3 * 4 + 1
+    assert features[8] == pytest.approx(-180.0)
+    assert features[-1] == pytest.approx(wrap_degrees(11.0 - 180.0))
+    assert stage.mean_yaws() == pytest.approx([-180.0, 11.0])
+
+
+def test_stage_restarts_when_tags_change():
+    stage = FeatureStage(size=10, interval=1.0)
+    stage.add(np.zeros((2, 3)), 0.0)
+    stage.add(np.zeros((2, 3)), 0.1)
+    stage.add(np.zeros((3, 3)), 0.2)
+    assert stage.tags == 3
+    assert len(stage.window) == 1
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+from up_goer.computer.computer import FrameQueue
+from up_goer.core import wire
+from up_goer.core.data_structures import GatewayData, SensorData, SensorTagData
+
+TAG_INDEX = {"A": 0, "B": 1}
+
+
+def frame(addresses: str, timestamp: float, session: str = "vest") -> bytes:
+    axes = SensorData(0.0, 0.0, 1.0)
+    samples = [SensorTagData(a, timestamp, axes, axes, axes) for a in addresses]
+    data = GatewayData(samples, None, session, list(TAG_INDEX))
+    return wire.encode(data, TAG_INDEX)
+
+
+def drain(queue: FrameQueue) -> list:
+    return [queue.get() for _ in range(len(queue))]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        FrameQueue(10, "newest")
+
+
+def test_drop_oldest():
+    queue = FrameQueue(2, "drop-oldest")
+    for received in range(3):
+        queue.put(frame("A", received), received)
+    assert queue.dropped == 1
+    assert queue.max_depth == 2
+    assert [received for _, received in drain(queue)] == [1, 2]
+
+
+def test_block_waits_for_room():
+    queue = FrameQueue(1, "block")
+    queue.put(b"first", 0)
+    putter = threading.Thread(target=queue.put, args=(b"second", 1))
+    putter.start()
+    putter.join(0.1)
+    assert putter.is_alive()
+    assert queue.get() == (b"first", 0)
+    putter.join(1.0)
+    assert not putter.is_alive()
+    assert queue.get() == (b"second", 1)
+    assert queue.dropped == 0
+
+
+def test_coalesce_keeps_newest_per_session_and_tags():
+    queue = FrameQueue(10, "coalesce")
+    queue.put(frame("A", 0.0), 0)
+    queue.put(frame("B", 0.0), 1)
+    queue.put(frame("A", 0.1), 2)
+    queue.put(frame("A", 0.1, "other"), 3)
+    queue.put(frame("AB", 0.2), 4)
+    assert queue.coalesced == 1
+    # The newer frame takes the place of the one it replaces
+    assert drain(queue) == [
+        (frame("A", 0.1), 2),
+        (frame("B", 0.0), 1),
+        (frame("A", 0.1, "other"), 3),
+        (frame("AB", 0.2), 4),
+    ]
+
+
+def test_coalesce_queues_json_and_drops_oldest_when_full():
+    queue = FrameQueue(2, "coalesce")
+    for received in range(3):
+        queue.put(b'{"sensor_tags": []}', received)
+    assert queue.coalesced == 0
+    assert queue.dropped == 1
+    assert [received for _, received in drain(queue)] == [1, 2]
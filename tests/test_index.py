@@ -0,0 +1,109 @@
+import gzip
+import io
+import math
+from pathlib import Path
+
+import pytest
+from up_goer.index.index import (
+    IndexWriter,
+    build_index,
+    index_path,
+    query_file,
+    query_files,
+    read_index,
+)
+
+ROWS = 500
+STEP = 0.05
+
+
+def write_log(path: Path, start: float, rows: int = ROWS) -> list[bytes]:
+    lines = [f"{start + i * STEP:.2f},{i},-{i}\n".encode() for i in range(rows)]
+    path.write_bytes(b"".join(lines))
+    build_index(path)
+    return lines
+
+
+def timestamp(line: bytes) -> float:
+    return float(line.split(b",")[0])
+
+
+def expected_rows(lines: list[bytes], start=None, end=None, every=None) -> list[bytes]:
+    kept = []
+    bucket = None
+    for line in lines:
+        t = timestamp(line)
+        if (start is not None and t < start) or (end is not None and t > end):
+            continue
+        if every:
+            if math.floor(t / every) == bucket:
+                continue
+            bucket = math.floor(t / every)
+        kept.append(line)
+    return kept
+
+
+def test_index_entries_every_interval(tmp_path: Path):
+    path = tmp_path / "log.csv"
+    write_log(path, 100.0)
+    timestamps, offsets = read_index(path)
+    assert timestamps == pytest.approx([100.0 + i for i in range(25)])
+    with open(path, "rb") as file:
+        for t, offset in zip(timestamps, offsets):
+            file.seek(offset)
+            assert timestamp(file.readline()) == pytest.approx(t)
+
+
+def test_truncated_index_line_is_ignored(tmp_path: Path):
+    path = tmp_path / "log.csv"
+    index = IndexWriter(path, 1.0)
+    assert index.add(1.0, 0)
+    assert not index.add(1.5, 10)
+    index.close()
+    with open(index_path(path), "a") as file:
+        file.write("2.0,2")
+    assert read_index(path) == ([1.0], [0])
+
+
+@pytest.mark.parametrize(
+    "start, end, every",
+    [
+        (None, None, None),
+        (103.0, None, None),
+        (None, 104.5, None),
+        (103.02, 103.98, None),
+        (101.0, 110.0, 0.5),
+        (None, None, 1.0),
+        (200.0, None, None),
+    ],
+)
+def test_query_file_matches_scan(tmp_path: Path, start, end, every):
+    path = tmp_path / "log.csv"
+    lines = write_log(path, 100.0)
+    expected = expected_rows(lines, start, end, every)
+    assert list(query_file(path, start, end, every)) == expected
+
+
+def test_gzipped_logs_are_scanned(tmp_path: Path):
+    path = tmp_path / "log.csv"
+    lines = write_log(path, 100.0)
+    with gzip.open(tmp_path / "log.csv.gz", "wb") as file:
+        file.write(path.read_bytes())
+    rows = list(query_file(tmp_path / "log.csv.gz", 110.0, 111.0))
+    assert rows == expected_rows(lines, 110.0, 111.0)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+@pytest.mark.parametrize("every", [None, 0.3])
+def test_query_files_in_order(tmp_path: Path, workers: int, every):
+    lines = []
+    paths = []
+    for i in range(4):
+        # Each file starts in the bucket the one before it ended in
+        paths.append(tmp_path / f"log{i}.csv")
+        lines += write_log(paths[-1], 100.0 + i * ROWS * STEP, ROWS)
+    output = io.BytesIO()
+    rows = query_files(paths, output, 105.0, 190.0, every, workers)
+    expected = expected_rows(lines, 105.0, 190.0, every)
+    assert output.getvalue() == b"".join(expected)
+    assert rows == len(expected)
@@ -0,0 +1,85 @@
+import itertools
+import struct
+
+import numpy as np
+import pytest
+from up_goer.core import wire
+from up_goer.core.data_structures import GatewayData, SensorData, SensorTagData
+
+ADDRESSES = ["54:6C:0E:52:F3:D1", "54:6C:0E:53:37:44", "54:6C:0E:53:37:DA"]
+TAG_INDEX = {address: i for i, address in enumerate(ADDRESSES)}
+
+
+def sample(address: str, timestamp: float, k: float = 1.0) -> SensorTagData:
+    return SensorTagData(
+        address,
+        timestamp,
+        SensorData(0.5 * k, -0.25 * k, 0.125),
+        SensorData(0.0, 0.0625, 1.0),
+        SensorData(20.0, -3.5, 45.0 * k),
+    )
+
+
+@pytest.mark.parametrize(
+    "published, session, tags, missing",
+    list(
+        itertools.product(
+            [None, 1700000000.25],
+            [None, "vest-7"],
+            [None, ADDRESSES],
+            [None, [ADDRESSES[1]]],
+        )
+    ),
+)
+def test_round_trip(published, session, tags, missing):
+    samples = [sample(ADDRESSES[2], 1000.5, 2.0), sample(ADDRESSES[0], 1000.25)]
+    data = GatewayData(samples, published, session, tags, missing)
+    frame = wire.decode(wire.encode(data, TAG_INDEX))
+
+    assert frame.timestamp == 1000.25
+    assert frame.published == published
+    assert frame.session == session
+    assert frame.tags == tags
+    assert frame.missing == (None if missing is None else [1])
+    assert frame.records["tag"].tolist() == [2, 0]
+    np.testing.assert_allclose(frame.records["offset"], [0.25, 0.0])
+    for record, tag in zip(frame.records, samples):
+        expected = [*tag.gyroscope, *tag.accelerometer, *tag.magnetometer]
+        np.testing.assert_allclose(record["axes"], expected, rtol=1e-6)
+
+
+def test_partial_decoders_match_decode():
+    data = GatewayData(
+        [sample(ADDRESSES[1], 5.0), sample(ADDRESSES[2], 5.1)],
+        6.0,
+        "vest-7",
+        ADDRESSES,
+        [ADDRESSES[0]],
+    )
+    payload = wire.encode(data, TAG_INDEX)
+
+    assert wire.is_binary(payload)
+    assert wire.decode_session(payload) == "vest-7"
+    assert wire.decode_tags(payload) == ("vest-7", bytes([1, 2]))
+    keys, missing = wire.tag_keys(wire.decode(payload))
+    assert keys == ADDRESSES[1:]
+    assert missing == ADDRESSES[:1]
+
+
+def test_tag_count_frames_keep_indices():
+    """Frames that carry only the number of tags, as older gateways sent"""
+    header = wire.HEADER.pack(wire.MAGIC, wire.VERSION, wire.FLAG_TAGS, 1, 2.0)
+    record = wire.RECORD.pack(1, 0.5, *range(9))
+    frame = wire.decode(header + wire.COUNT.pack(3) + record)
+
+    assert frame.tags == [0, 1, 2]
+    assert wire.tag_keys(frame) == ([1], None)
+
+
+def test_json_and_unknown_versions_are_rejected():
+    assert not wire.is_binary(b'{"sensor_tags": []}')
+    with pytest.raises(ValueError):
+        wire.decode(b'{"sensor_tags": [], "pad": 0}')
+    header = struct.pack("<2sBBHd", wire.MAGIC, wire.VERSION + 1, 0, 0, 0.0)
+    with pytest.raises(ValueError):
+        wire.decode(header)
@@ -1,4 +1,7 @@
-from up_goer.cli import app
+def __getattr__(name: str):
+    # Importing a subsystem should not import the CLI and everything it uses
+    if name == "app":
+        from up_goer.cli import app
 
-if __name__ == "__main__":
-    app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,3 @@
+from up_goer.cli import app
+
+app()
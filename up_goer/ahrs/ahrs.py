@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 
 class MadgwickAHRS:
     """
@@ -13,10 +15,48 @@ class MadgwickAHRS:
     Total sqrt: 5
     """
 
-    def __init__(self, sample_period: float, beta: float):
+    def __init__(self, sample_period: float, beta: float, max_dt: float = None):
         self.quaternion = [1.0, 0.0, 0.0, 0.0]
         self.sample_period = sample_period
         self.beta = beta
+        # Longest step integrated between timestamped samples, to bridge gaps
+        self.max_dt = max_dt if max_dt is not None else 5 * sample_period
+        self.timestamp = None
+
+    def step(self, timestamp: float) -> float:
+        """
+        Time since the previous timestamped sample, clamped to [0, max_dt].
+        The first sample integrates over sample_period and an out of order
+        sample over nothing, without moving the clock back.
+        """
+        if self.timestamp is None:
+            self.timestamp = timestamp
+            return self.sample_period
+        dt = timestamp - self.timestamp
+        if dt <= 0:
+            return 0.0
+        self.timestamp = timestamp
+        return min(dt, self.max_dt)
+
+    def update_at(self, timestamp: float, *values: float):
+        """Algorithm AHRS update method integrating over the time since the last sample."""
+        self.update(*values, dt=self.step(timestamp))
+
+    def update_many(self, data, timestamps=None):
+        """
+        Integrates an ordered block of samples in one call.
+
+        @param data: Sequence of (gx, gy, gz, ax, ay, az, mx, my, mz) rows.
+        @param timestamps: Sample times, the fixed sample_period is used if None.
+        """
+        update = self.update
+        if timestamps is None:
+            for row in data:
+                update(*row)
+            return
+        step = self.step
+        for timestamp, row in zip(timestamps, data):
+            update(*row, dt=step(timestamp))
 
     def update(
         self,
@@ -29,6 +69,7 @@ class MadgwickAHRS:
         mx: float,
         my: float,
         mz: float,
+        dt: float = None,
     ):
         """
         Algorithm AHRS update method. Requires only gyroscope and accelerometer data.
@@ -42,7 +83,11 @@ class MadgwickAHRS:
         @param mx: Magnetometer x axis measurement in any calibrated units.
         @param my: Magnetometer y axis measurement in any calibrated units.
         @param mz: Magnetometer z axis measurement in any calibrated units.
+        @param dt: Seconds to integrate over, defaults to the sample period.
         """
+        if dt is None:
+            dt = self.sample_period
+
         # Auxiliary variables to avoid repeated arithmetic
         q1, q2, q3, q4 = self.quaternion
         _2q1 = 2 * q1
@@ -173,10 +218,10 @@ class MadgwickAHRS:
         qDot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - self.beta * s4
 
         # Integrate to yield quaternion
-        q1 += qDot1 * self.sample_period
-        q2 += qDot2 * self.sample_period
-        q3 += qDot3 * self.sample_period
-        q4 += qDot4 * self.sample_period
+        q1 += qDot1 * dt
+        q2 += qDot2 * dt
+        q3 += qDot3 * dt
+        q4 += qDot4 * dt
         norm = 1 / math.sqrt(
             q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4
         )  # normalise quaternion
@@ -186,6 +231,252 @@ class MadgwickAHRS:
         self.quaternion[3] = q4 * norm
 
 
+class MadgwickAHRSBank:
+    """
+    Vectorised bank of Madgwick AHRS filters, one row per sensor tag.
+
+    Holds every quaternion in a single (N, 4) array and updates all tags in one
+    NumPy step from an (N, 9) array of gyroscope, accelerometer and magnetometer
+    readings laid out in the same order as the arguments of MadgwickAHRS.update.
+    Each row is numerically equivalent to a scalar MadgwickAHRS.
+    """
+
+    def __init__(
+        self, sample_period: float, beta: float, size: int = 0, max_dt: float = None
+    ):
+        self.quaternions = np.zeros((size, 4))
+        self.quaternions[:, 0] = 1.0
+        self.timestamps = np.full(size, np.nan)
+        self.sample_period = sample_period
+        self.beta = beta
+        self.max_dt = max_dt if max_dt is not None else 5 * sample_period
+
+    def __len__(self):
+        return len(self.quaternions)
+
+    def add(self) -> int:
+        """Appends a filter at the identity quaternion and returns its row index."""
+        self.quaternions = np.vstack([self.quaternions, [1.0, 0.0, 0.0, 0.0]])
+        self.timestamps = np.append(self.timestamps, np.nan)
+        return len(self.quaternions) - 1
+
+    def step(self, timestamps: np.ndarray, index: np.ndarray) -> np.ndarray:
+        """Vectorised MadgwickAHRS.step for the given rows"""
+        previous = self.timestamps[index]
+        dt = np.clip(timestamps - previous, 0.0, self.max_dt)
+        dt[np.isnan(previous)] = self.sample_period
+        self.timestamps[index] = np.fmax(previous, timestamps)
+        return dt
+
+    def update_at(self, data: np.ndarray, timestamps, index: np.ndarray = None):
+        """Algorithm AHRS update method integrating each row over its own time step."""
+        if index is None:
+            index = np.arange(len(self.quaternions))
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.update(data, index, self.step(timestamps, index))
+
+    def update(self, data: np.ndarray, index: np.ndarray = None, dt=None):
+        """
+        Algorithm AHRS update method for many tags at once.
+
+        @param data: (M, 9) array of gx, gy, gz, ax, ay, az, mx, my, mz per row.
+        @param index: Rows of the bank to update, in the same order as data.
+            Defaults to every row of the bank. Must not contain duplicates.
+        @param dt: Seconds to integrate over, a scalar or one per row.
+            Defaults to the sample period.
+        """
+        data = np.asarray(data, dtype=np.float64)
+        if index is None:
+            index = np.arange(len(self.quaternions))
+        if dt is None:
+            dt = self.sample_period
+        dt = np.broadcast_to(np.asarray(dt, dtype=np.float64), index.shape)
+        q = self.quaternions[index]
+        q1, q2, q3, q4 = q.T
+        gx, gy, gz, ax, ay, az, mx, my, mz = data.T
+
+        # Rows with a zero accelerometer or magnetometer norm are left untouched
+        a_norm = np.sqrt(ax * ax + ay * ay + az * az)
+        m_norm = np.sqrt(mx * mx + my * my + mz * mz)
+        valid = (a_norm != 0) & (m_norm != 0)
+        if not valid.all():
+            index = index[valid]
+            q1, q2, q3, q4 = q1[valid], q2[valid], q3[valid], q4[valid]
+            gx, gy, gz = gx[valid], gy[valid], gz[valid]
+            ax, ay, az = ax[valid], ay[valid], az[valid]
+            mx, my, mz = mx[valid], my[valid], mz[valid]
+            a_norm, m_norm = a_norm[valid], m_norm[valid]
+            dt = dt[valid]
+        if len(index) == 0:
+            return
+
+        # Auxiliary variables to avoid repeated arithmetic
+        _2q1 = 2 * q1
+        _2q2 = 2 * q2
+        _2q3 = 2 * q3
+        _2q4 = 2 * q4
+        _2q1q3 = 2 * q1 * q3
+        _2q3q4 = 2 * q3 * q4
+        q1q1 = q1 * q1
+        q1q2 = q1 * q2
+        q1q3 = q1 * q3
+        q1q4 = q1 * q4
+        q2q2 = q2 * q2
+        q2q3 = q2 * q3
+        q2q4 = q2 * q4
+        q3q3 = q3 * q3
+        q3q4 = q3 * q4
+        q4q4 = q4 * q4
+
+        # Normalise accelerometer and magnetometer measurements
+        norm = 1 / a_norm
+        ax = ax * norm
+        ay = ay * norm
+        az = az * norm
+        norm = 1 / m_norm
+        mx = mx * norm
+        my = my * norm
+        mz = mz * norm
+
+        # Reference direction of Earth's magnetic field
+        _2q1mx = 2 * q1 * mx
+        _2q1my = 2 * q1 * my
+        _2q1mz = 2 * q1 * mz
+        _2q2mx = 2 * q2 * mx
+        hx = (
+            mx * q1q1
+            - _2q1my * q4
+            + _2q1mz * q3
+            + mx * q2q2
+            + _2q2 * my * q3
+            + _2q2 * mz * q4
+            - mx * q3q3
+            - mx * q4q4
+        )
+        hy = (
+            _2q1mx * q4
+            + my * q1q1
+            - _2q1mz * q2
+            + _2q2mx * q3
+            - my * q2q2
+            + my * q3q3
+            + _2q3 * mz * q4
+            - my * q4q4
+        )
+        _2bx = np.sqrt(hx * hx + hy * hy)
+        _2bz = (
+            -_2q1mx * q3
+            + _2q1my * q2
+            + mz * q1q1
+            + _2q2mx * q4
+            - mz * q2q2
+            + _2q3 * my * q4
+            - mz * q3q3
+            + mz * q4q4
+        )
+        _4bx = 2 * _2bx
+        _4bz = 2 * _2bz
+
+        # Gradient decent algorithm corrective step
+        fa1 = 2 * q2q4 - _2q1q3 - ax
+        fa2 = 2 * q1q2 + _2q3q4 - ay
+        fa3 = 1 - 2 * q2q2 - 2 * q3q3 - az
+        fm1 = _2bx * (0.5 - q3q3 - q4q4) + _2bz * (q2q4 - q1q3) - mx
+        fm2 = _2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my
+        fm3 = _2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz
+        s1 = (
+            -_2q3 * fa1
+            + _2q2 * fa2
+            - _2bz * q3 * fm1
+            + (-_2bx * q4 + _2bz * q2) * fm2
+            + _2bx * q3 * fm3
+        )
+        s2 = (
+            _2q4 * fa1
+            + _2q1 * fa2
+            - 4 * q2 * fa3
+            + _2bz * q4 * fm1
+            + (_2bx * q3 + _2bz * q1) * fm2
+            + (_2bx * q4 - _4bz * q2) * fm3
+        )
+        s3 = (
+            -_2q1 * fa1
+            + _2q4 * fa2
+            - 4 * q3 * fa3
+            + (-_4bx * q3 - _2bz * q1) * fm1
+            + (_2bx * q2 + _2bz * q4) * fm2
+            + (_2bx * q1 - _4bz * q3) * fm3
+        )
+        s4 = (
+            _2q2 * fa1
+            + _2q3 * fa2
+            + (-_4bx * q4 + _2bz * q2) * fm1
+            + (-_2bx * q1 + _2bz * q3) * fm2
+            + _2bx * q2 * fm3
+        )
+        norm = 1 / np.sqrt(s1 * s1 + s2 * s2 + s3 * s3 + s4 * s4)
+        s1 = s1 * norm
+        s2 = s2 * norm
+        s3 = s3 * norm
+        s4 = s4 * norm
+
+        # Compute rate of change of quaternion
+        qDot1 = 0.5 * (-q2 * gx - q3 * gy - q4 * gz) - self.beta * s1
+        qDot2 = 0.5 * (q1 * gx + q3 * gz - q4 * gy) - self.beta * s2
+        qDot3 = 0.5 * (q1 * gy - q2 * gz + q4 * gx) - self.beta * s3
+        qDot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - self.beta * s4
+
+        # Integrate to yield quaternion
+        q = np.stack(
+            [
+                q1 + qDot1 * dt,
+                q2 + qDot2 * dt,
+                q3 + qDot3 * dt,
+                q4 + qDot4 * dt,
+            ],
+            axis=1,
+        )
+        q *= 1 / np.sqrt((q * q).sum(axis=1))[:, None]  # normalise quaternion
+        self.quaternions[index] = q
+
+
+def initial_quaternion(
+    ax: float, ay: float, az: float, mx: float, my: float, mz: float
+) -> list[float] or None:
+    """
+    Orientation from a single accelerometer and magnetometer sample, at which
+    MadgwickAHRS has already converged for that sample. None if either is zero
+    or they are parallel.
+    """
+    # Earth's up and magnetic north axes in sensor coordinates
+    norm = math.sqrt(ax * ax + ay * ay + az * az)
+    if norm == 0:
+        return None
+    zx, zy, zz = ax / norm, ay / norm, az / norm
+    yx, yy, yz = zy * mz - zz * my, zz * mx - zx * mz, zx * my - zy * mx
+    norm = math.sqrt(yx * yx + yy * yy + yz * yz)
+    if norm == 0:
+        return None
+    yx, yy, yz = yx / norm, yy / norm, yz / norm
+    xx, xy, xz = yy * zz - yz * zy, yz * zx - yx * zz, yx * zy - yy * zx
+
+    # Quaternion of the rotation matrix with rows x, y and z
+    trace = xx + yy + zz
+    if trace > 0:
+        s = math.sqrt(trace + 1) * 2
+        q = [s / 4, (zy - yz) / s, (xz - zx) / s, (yx - xy) / s]
+    elif xx > yy and xx > zz:
+        s = math.sqrt(1 + xx - yy - zz) * 2
+        q = [(zy - yz) / s, s / 4, (xy + yx) / s, (xz + zx) / s]
+    elif yy > zz:
+        s = math.sqrt(1 + yy - xx - zz) * 2
+        q = [(xz - zx) / s, (xy + yx) / s, s / 4, (yz + zy) / s]
+    else:
+        s = math.sqrt(1 + zz - xx - yy) * 2
+        q = [(yx - xy) / s, (xz + zx) / s, (yz + zy) / s, s / 4]
+    return [float(value) for value in q]
+
+
 def euler_from_quaternion(x, y, z, w):
     """
     Convert a quaternion into euler angles (roll, pitch, yaw)
@@ -209,7 +500,32 @@ def euler_from_quaternion(x, y, z, w):
     return roll_x, pitch_y, yaw_z  # in radians
 
 
+def wrap_degrees(angles):
+    """Wraps angles in degrees, a float or an array, to [-180, 180)"""
+    return (angles + 180.0) % 360.0 - 180.0
+
+
 def get_yaw(x, y, z, w):
     rad = euler_from_quaternion(x, y, z, w)[2]
     yaw = round(rad * 180 / math.pi, 2)
     return yaw
+
+
+def get_yaws(quaternions: np.ndarray) -> np.ndarray:
+    """Vectorised get_yaw over an (N, 4) array of quaternions."""
+    x, y, z, w = np.asarray(quaternions).T
+    t3 = +2.0 * (w * z + x * y)
+    t4 = +1.0 - 2.0 * (y * y + z * z)
+    return np.round(np.degrees(np.arctan2(t3, t4)), 2)
+
+
+def get_angles(quaternions: np.ndarray) -> np.ndarray:
+    """
+    Vectorised euler_from_quaternion over an (N, 4) array of quaternions, as an
+    (N, 3) array of roll, pitch and yaw in degrees. The yaws match get_yaws.
+    """
+    x, y, z, w = np.asarray(quaternions).T
+    roll = np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y))
+    pitch = np.arcsin(np.clip(2.0 * (w * y - z * x), -1.0, 1.0))
+    yaw = np.arctan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))
+    return np.degrees(np.stack([roll, pitch, yaw], axis=1))
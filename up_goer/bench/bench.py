@@ -0,0 +1,243 @@
+import platform
+import random
+import statistics
+import struct
+import subprocess
+import sys
+import time
+
+import numpy as np
+from up_goer.ahrs.ahrs import MadgwickAHRS, MadgwickAHRSBank
+from up_goer.cc2650.cc2650 import (
+    AccelerometerSensorMovementSensorMPU9250,
+    GyroscopeSensorMovementSensorMPU9250,
+    MagnetometerSensorMovementSensorMPU9250,
+    MovementDecoder,
+    MovementSensorMPU9250,
+)
+from up_goer.cfg import cfg
+from up_goer.computer.computer import Computer, ComputerOptions
+from up_goer.core import wire
+from up_goer.core.data_structures import (
+    ClassifyingData,
+    GatewayData,
+    SensorData,
+    SensorTagData,
+)
+
+SEED = 0
+
+
+def _addresses(tags: int) -> list[str]:
+    return [f"54:6C:0E:52:F3:{i:02X}" for i in range(tags)]
+
+
+def _random_gateway_data(addresses: list[str], timestamp: float) -> GatewayData:
+    def sensor_data():
+        return SensorData(*[random.uniform(-1, 1) for _ in range(3)])
+
+    return GatewayData(
+        [
+            SensorTagData(
+                address, timestamp, sensor_data(), sensor_data(), sensor_data()
+            )
+            for address in addresses
+        ]
+    )
+
+
+def _rate(function, items: list) -> float:
+    """Calls function on every item and returns calls per second"""
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "time": time.time(),
+    }
+
+
+def bench_ahrs(samples: int = 2000, tags: int = 3) -> dict:
+    """AHRS updates per second for one tag, and for many tags scalar and vectorised"""
+    rng = np.random.default_rng(SEED)
+    data = rng.uniform(-1, 1, (samples, tags, 9))
+    rows = data[:, 0].tolist()
+
+    ahrs = MadgwickAHRS(cfg.SAMPLE_PERIOD, cfg.BETA)
+    single = _rate(lambda row: ahrs.update(*row), rows)
+
+    filters = [MadgwickAHRS(cfg.SAMPLE_PERIOD, cfg.BETA) for _ in range(tags)]
+    steps = data.tolist()
+
+    def scalar_step(step):
+        for ahrs, row in zip(filters, step):
+            ahrs.update(*row)
+
+    scalar = _rate(scalar_step, steps) * tags
+
+    bank = MadgwickAHRSBank(cfg.SAMPLE_PERIOD, cfg.BETA, tags)
+    vectorised = _rate(bank.update, list(data)) * tags
+
+    return {
+        "samples": samples,
+        "tags": tags,
+        "single_tag_updates_per_s": single,
+        "scalar_tag_updates_per_s": scalar,
+        "bank_tag_updates_per_s": vectorised,
+    }
+
+
+def bench_wire(frames: int = 10000, tags: int = 3) -> dict:
+    """Compares bytes per frame and encode/decode rates of the JSON and binary formats"""
+    random.seed(SEED)
+    addresses = _addresses(tags)
+    tag_index = {address: i for i, address in enumerate(addresses)}
+    data = [_random_gateway_data(addresses, time.time()) for _ in range(frames)]
+    json_payloads = [frame.to_json().encode() for frame in data]
+    binary_payloads = [wire.encode(frame, tag_index) for frame in data]
+
+    return {
+        "frames": frames,
+        "tags": tags,
+        "json": {
+            "bytes_per_frame": len(json_payloads[0]),
+            "encode_per_s": _rate(lambda frame: frame.to_json().encode(), data),
+            "decode_per_s": _rate(
+                lambda payload: GatewayData.from_json(payload.decode()),
+                json_payloads,
+            ),
+        },
+        "binary": {
+            "bytes_per_frame": len(binary_payloads[0]),
+            "encode_per_s": _rate(lambda frame: wire.encode(frame, tag_index), data),
+            "decode_per_s": _rate(wire.decode, binary_payloads),
+        },
+    }
+
+
+def bench_classifying(messages: int = 10000, tags: int = 3) -> dict:
+    """ClassifyingData JSON encode/decode rates"""
+    random.seed(SEED)
+    data = [
+        ClassifyingData([round(random.uniform(-180, 180), 2) for _ in range(tags)])
+        for _ in range(messages)
+    ]
+    payloads = [item.to_json().encode() for item in data]
+    return {
+        "messages": messages,
+        "tags": tags,
+        "bytes_per_message": len(payloads[0]),
+        "encode_per_s": _rate(lambda item: item.to_json().encode(), data),
+        "decode_per_s": _rate(
+            lambda payload: ClassifyingData.from_json(payload.decode()), payloads
+        ),
+    }
+
+
+def bench_notifications(notifications: int = 50000) -> dict:
+    """Raw MPU9250 notification decode rates, through the sub services, alone and batched"""
+    random.seed(SEED)
+    movement_sensor = MovementSensorMPU9250()
+    movement_sensor.register(AccelerometerSensorMovementSensorMPU9250())
+    movement_sensor.register(GyroscopeSensorMovementSensorMPU9250())
+    movement_sensor.register(MagnetometerSensorMovementSensorMPU9250())
+    packets = [
+        bytearray(struct.pack("<9h", *random.choices(range(-32768, 32768), k=9)))
+        for _ in range(notifications)
+    ]
+    decoder = MovementDecoder()
+
+    def push(packet):
+        if decoder.push(packet):
+            decoder.decode_batch()
+
+    return {
+        "notifications": notifications,
+        "decode_per_s": _rate(
+            lambda packet: movement_sensor.callback(0, packet), packets
+        ),
+        "decoder_per_s": _rate(decoder.decode, packets),
+        "batch_decode_per_s": _rate(push, packets),
+    }
+
+
+def bench_computer(frames: int = 5000, tags: int = 3, bank: bool = False) -> dict:
+    """Gateway frames per second through Computer._parse, logger publishing included"""
+    random.seed(SEED)
+    addresses = _addresses(tags)
+    data = [_random_gateway_data(addresses, time.time()) for _ in range(frames)]
+    computer = Computer(ComputerOptions(bank, remote=False), connect=False)
+    return {
+        "frames": frames,
+        "tags": tags,
+        "bank": bank,
+        "messages_per_s": _rate(computer._parse, data),
+    }
+
+
+# Modules each command imports before it starts working, see up_goer.cli
+COMMAND_MODULES = {
+    "discover": ["bleak"],
+    "gateway": ["up_goer.gateway.gateway"],
+    "gateway simulate": ["up_goer.gateway.gateway", "up_goer.simulator.simulator"],
+    "computer": ["up_goer.computer.computer"],
+    "local": [
+        "up_goer.computer.computer",
+        "up_goer.gateway.gateway",
+        "up_goer.logger.logger",
+    ],
+    "train-classifier": ["up_goer.classifier.classifier"],
+    "generate-csv": ["up_goer.logger.logger"],
+    "index-csv": ["up_goer.index.index"],
+    "query": ["up_goer.index.index"],
+    "generate-store": ["up_goer.logger.logger", "up_goer.store.store"],
+    "convert-to-store": ["up_goer.store.store"],
+    "record-gateway": ["up_goer.replay.replay"],
+    "replay": ["up_goer.replay.replay"],
+    "spam-server": ["up_goer.spammer.spammer"],
+    "observe-server": ["up_goer.server_logger.server_logger"],
+    "bench": ["up_goer.bench.bench"],
+}
+
+
+def _startup(modules: list[str], repeats: int) -> float:
+    """Median seconds for a fresh interpreter to import modules and exit"""
+    code = "; ".join(f"import {module}" for module in modules) or "pass"
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def bench_startup(repeats: int = 5) -> dict:
+    """Cold start of the interpreter alone, the CLI, and the CLI with each command"""
+    return {
+        "repeats": repeats,
+        "python_s": _startup([], repeats),
+        "cli_s": _startup(["up_goer.cli"], repeats),
+        "commands_s": {
+            command: _startup(["up_goer.cli", *modules], repeats)
+            for command, modules in COMMAND_MODULES.items()
+        },
+    }
+
+
+def bench_all(tags: int = 3) -> dict:
+    return {
+        "ahrs": bench_ahrs(tags=tags),
+        "ahrs_many_tags": bench_ahrs(samples=200, tags=100 * tags),
+        "wire": bench_wire(tags=tags),
+        "classifying": bench_classifying(tags=tags),
+        "notifications": bench_notifications(),
+        "computer": bench_computer(tags=tags),
+        "computer_bank": bench_computer(tags=tags, bank=True),
+    }
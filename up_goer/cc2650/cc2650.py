@@ -10,6 +10,21 @@ Adapted by Ashwin from the following sources:
 """
 import math
 import struct
+import time
+from array import array
+
+import numpy as np
+
+
+def movement_period(period_ms: float) -> int:
+    """
+    The notification period in ms the firmware runs at for period_ms, which it
+    sets in steps of 10 ms from 10 to 2550 ms
+    """
+    period = round(period_ms / 10) * 10
+    if not 10 <= period <= 2550:
+        raise ValueError(f"Movement period must be 10-2550 ms, got {period_ms:g}")
+    return period
 
 
 class Service:
@@ -45,6 +60,9 @@ class Sensor(Service):
 class MovementSensorMPU9250SubService:
     def __init__(self):
         self.bits = 0
+        # Position of this sub service's x, y, z in a decoded notification
+        self.offset = 0
+        self.data = [0, 0, 0]
 
     def enable_bits(self):
         return self.bits
@@ -52,6 +70,13 @@ class MovementSensorMPU9250SubService:
     def cb_sensor(self, data):
         raise NotImplementedError
 
+    def cb_decoded(self, values):
+        """Takes its readings from a notification already scaled by MovementDecoder"""
+        offset = self.offset
+        self.data[0] = values[offset]
+        self.data[1] = values[offset + 1]
+        self.data[2] = values[offset + 2]
+
 
 class MovementSensorMPU9250(Sensor):
     GYRO_XYZ = 7
@@ -61,20 +86,31 @@ class MovementSensorMPU9250(Sensor):
     ACCEL_RANGE_4G = 1 << 8
     ACCEL_RANGE_8G = 2 << 8
     ACCEL_RANGE_16G = 3 << 8
+    DATA_UUID = "f000aa81-0451-4000-b000-000000000000"
+    CTRL_UUID = "f000aa82-0451-4000-b000-000000000000"
+    RATE_UUID = "f000aa83-0451-4000-b000-000000000000"
 
-    def __init__(self):
+    def __init__(self, period_ms: int = 100):
         super().__init__()
-        self.data_uuid = "f000aa81-0451-4000-b000-000000000000"
-        self.ctrl_uuid = "f000aa82-0451-4000-b000-000000000000"
-        self.rate_uuid = "f000aa83-0451-4000-b000-000000000000"
+        self.data_uuid = self.DATA_UUID
+        self.ctrl_uuid = self.CTRL_UUID
+        self.rate_uuid = self.RATE_UUID
         self.ctrlBits = 0
-        self.rate = 0x0A
+        # Notification period in units of 10 ms
+        self.rate = movement_period(period_ms) // 10
 
+        self.decoder = MovementDecoder()
         self.sub_callbacks = []
+        self.notify_callbacks = []
 
     def register(self, cls_obj: MovementSensorMPU9250SubService):
         self.ctrlBits |= cls_obj.enable_bits()
-        self.sub_callbacks.append(cls_obj.cb_sensor)
+        self.sub_callbacks.append(cls_obj.cb_decoded)
+
+    def on_notify(self, callback):
+        """Calls callback(timestamp) with the arrival time of every notification,
+        after the sub services have been updated"""
+        self.notify_callbacks.append(callback)
 
     async def start_listener(self, client, *args):
         # start the sensor on the device
@@ -85,9 +121,79 @@ class MovementSensorMPU9250(Sensor):
         await client.start_notify(self.data_uuid, self.callback)
 
     def callback(self, sender: int, data: bytearray):
-        unpacked_data = struct.unpack("<hhhhhhhhh", data)
+        timestamp = time.time()
+        values = self.decoder.decode(data)
         for cb in self.sub_callbacks:
-            cb(unpacked_data)
+            cb(values)
+        for cb in self.notify_callbacks:
+            cb(timestamp)
+
+
+class MovementDecoder:
+    """
+    Decodes MPU9250 notifications with a precompiled struct and a single scale
+    vector, giving gyroscope (rad/s), accelerometer (g) and magnetometer (uT)
+    x, y, z in the order MadgwickAHRS.update takes them.
+
+    decode writes into the preallocated latest buffer. push copies raw
+    notifications into a preallocated ring of capacity packets, which
+    decode_batch scales together into a (n, 9) NumPy array.
+    """
+
+    STRUCT = struct.Struct("<9h")
+
+    def __init__(self, capacity: int = 64):
+        gyro = GyroscopeSensorMovementSensorMPU9250().scale * math.pi / 180
+        accel = AccelerometerSensorMovementSensorMPU9250().scale
+        mag = MagnetometerSensorMovementSensorMPU9250().scale
+        self.scale = (gyro,) * 3 + (accel,) * 3 + (mag,) * 3
+        self.latest = array("d", [0.0] * 9)
+
+        self.capacity = capacity
+        self.raw = bytearray(self.STRUCT.size * capacity)
+        self.count = 0
+        self.batch = np.zeros((capacity, 9))
+        self.scale_vector = np.array(self.scale)
+
+    def decode(self, data: bytearray) -> array:
+        s0, s1, s2, s3, s4, s5, s6, s7, s8 = self.scale
+        v0, v1, v2, v3, v4, v5, v6, v7, v8 = self.STRUCT.unpack(data)
+        latest = self.latest
+        latest[0] = v0 * s0
+        latest[1] = v1 * s1
+        latest[2] = v2 * s2
+        latest[3] = v3 * s3
+        latest[4] = v4 * s4
+        latest[5] = v5 * s5
+        latest[6] = v6 * s6
+        latest[7] = v7 * s7
+        latest[8] = v8 * s8
+        return latest
+
+    def push(self, data: bytearray) -> bool:
+        """
+        Buffers a raw notification, returns True once the ring is full. A full
+        ring has to be emptied with decode_batch before the next push.
+        """
+        if self.count == self.capacity:
+            raise ValueError("MovementDecoder ring is full, call decode_batch first")
+        size = self.STRUCT.size
+        offset = self.count * size
+        self.raw[offset : offset + size] = data
+        self.count += 1
+        return self.count == self.capacity
+
+    def decode_batch(self) -> np.ndarray:
+        """
+        Scales every buffered notification and empties the ring. The result
+        is a view of a reused buffer, valid until the next decode_batch.
+        """
+        count = self.count
+        raw = np.frombuffer(self.raw, dtype="<i2", count=count * 9).reshape(count, 9)
+        out = self.batch[:count]
+        np.multiply(raw, self.scale_vector, out=out)
+        self.count = 0
+        return out
 
 
 class AccelerometerSensorMovementSensorMPU9250(MovementSensorMPU9250SubService):
@@ -99,6 +205,7 @@ class AccelerometerSensorMovementSensorMPU9250(MovementSensorMPU9250SubService):
         self.scale = (
             8.0 / 32768.0
         )  # TODO: why not 4.0, as documented? @Ashwin Need to verify
+        self.offset = 3
         self.data = [0, 0, 0]
 
     def cb_sensor(self, data):
@@ -117,6 +224,7 @@ class MagnetometerSensorMovementSensorMPU9250(MovementSensorMPU9250SubService):
         self.bits = MovementSensorMPU9250.MAG_XYZ
         self.scale = 4912.0 / 32760
         # Reference: MPU-9250 register map v1.4
+        self.offset = 6
         self.data = [0, 0, 0]
 
     def cb_sensor(self, data):
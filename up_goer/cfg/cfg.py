@@ -1,34 +1,94 @@
-from dotenv import dotenv_values
+"""
+Settings are read on first use from UP_GOER_<NAME> environment variables, then
+.env, then the defaults below, and override takes precedence over all of them.
+Commands that never touch a setting never need it to be set.
+"""
+
+import os
+
 from up_goer.utils.utils import get_tag_address
 
-config = dotenv_values()
-
-HOST = "xinming.ddns.net"
-USER = "guest"
-PASSWORD = config["SERVER_PASSWORD"]
-PREDICT_TOPIC = "posture/predict"
-CLASSIFY_TOPIC = "posture/classify"
-
-TAG_ADDRESS_1 = config.get("TAG_ADDRESS_1") or get_tag_address(
-    "54:6C:0E:52:F3:D1", "54FCFF89-ED9C-4C6A-9FD8-58AB675D5992"
-)
-TAG_ADDRESS_2 = config.get("TAG_ADDRESS_2") or get_tag_address(
-    "54:6C:0E:53:37:44", "22B9C408-07FF-41EC-9C28-21EC34AFD42E"
-)
-TAG_ADDRESS_3 = config.get("TAG_ADDRESS_3") or get_tag_address(
-    "54:6C:0E:53:37:DA", "BBC05C31-1B99-4567-90DF-9CA8412F4670"
-)
-TAG_ADDRESS_4 = config.get("TAG_ADDRESS_4") or get_tag_address(
-    "98:07:2D:1D:50:86", "86ECDCBA-A097-4061-BE0E-65AB0CFA049C"
-)
-
-SAMPLE_PERIOD = 1 / 10
-BETA = 2.5
-
-GATEWAY_HOST = "localhost"
-GATEWAY_TOPIC = "posture/gateway"
-
-COMPUTER_HOST = "localhost"
-
-LOGGER_HOST = "localhost"
-LOGGER_TOPIC = "posture/logger"
+DEFAULTS = {
+    "HOST": "xinming.ddns.net",
+    "USER": "guest",
+    "PASSWORD": None,
+    "PREDICT_TOPIC": "posture/predict",
+    "CLASSIFY_TOPIC": "posture/classify",
+    "FEATURES_TOPIC": "posture/features",
+    "TAG_ADDRESS_1": get_tag_address(
+        "54:6C:0E:52:F3:D1", "54FCFF89-ED9C-4C6A-9FD8-58AB675D5992"
+    ),
+    "TAG_ADDRESS_2": get_tag_address(
+        "54:6C:0E:53:37:44", "22B9C408-07FF-41EC-9C28-21EC34AFD42E"
+    ),
+    "TAG_ADDRESS_3": get_tag_address(
+        "54:6C:0E:53:37:DA", "BBC05C31-1B99-4567-90DF-9CA8412F4670"
+    ),
+    "TAG_ADDRESS_4": get_tag_address(
+        "98:07:2D:1D:50:86", "86ECDCBA-A097-4061-BE0E-65AB0CFA049C"
+    ),
+    "SAMPLE_PERIOD": 1 / 10,
+    "MOVEMENT_PERIOD_MS": 100,
+    "BETA": 2.5,
+    "GATEWAY_HOST": "localhost",
+    "GATEWAY_TOPIC": "posture/gateway",
+    "COMPUTER_HOST": "localhost",
+    "LOGGER_HOST": "localhost",
+    "LOGGER_TOPIC": "posture/logger",
+    "STATS_HOST": "localhost",
+    "STATS_TOPIC": "posture/stats",
+}
+
+# Settings whose .env key has another name
+KEYS = {"PASSWORD": "SERVER_PASSWORD"}
+
+# Settings without a default that must be set before they are used
+REQUIRED = {"PASSWORD"}
+
+_config = None
+
+
+def _load() -> dict:
+    global _config
+    if _config is None:
+        from dotenv import dotenv_values
+
+        _config = dotenv_values()
+    return _config
+
+
+def _convert(name: str, value: str):
+    default = DEFAULTS[name]
+    if default is None or isinstance(default, str):
+        return value
+    return type(default)(value)
+
+
+def override(**settings):
+    """
+    Sets settings over the environment and .env, for this process and, through
+    its environment, the processes it starts, which import cfg afresh under
+    the spawn start method
+    """
+    for name, value in settings.items():
+        if name not in DEFAULTS:
+            raise ValueError(f"Unknown setting: {name}")
+        globals()[name] = _convert(name, value) if isinstance(value, str) else value
+        os.environ[f"UP_GOER_{name}"] = str(value)
+
+
+def __getattr__(name: str):
+    if name not in DEFAULTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = os.environ.get(f"UP_GOER_{name}") or _load().get(KEYS.get(name, name))
+    if value:
+        value = _convert(name, value)
+    else:
+        value = DEFAULTS[name]
+    if value is None and name in REQUIRED:
+        raise ValueError(
+            f"{KEYS.get(name, name)} is not set, add it to .env or set UP_GOER_{name}"
+        )
+    # Cached as a module attribute, so later reads skip this function
+    globals()[name] = value
+    return value
@@ -0,0 +1,84 @@
+import math
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from dataclasses_json import dataclass_json
+from up_goer.ahrs.ahrs import wrap_degrees
+from up_goer.core.data_structures import Prediction
+
+
+def features(yaws: list[float]) -> list[float]:
+    """
+    Yaws of every tag relative to the first, so that the direction the wearer
+    faces does not matter. A single tag has only its own yaw.
+    """
+    if len(yaws) == 1:
+        return list(yaws)
+    return [wrap_degrees(yaw - yaws[0]) for yaw in yaws[1:]]
+
+
+def _circular_mean(rows: np.ndarray) -> list[float]:
+    radians = np.radians(rows)
+    mean = np.arctan2(np.sin(radians).mean(axis=0), np.cos(radians).mean(axis=0))
+    return np.degrees(mean).tolist()
+
+
+@dataclass_json
+@dataclass
+class CentroidClassifier:
+    """
+    Nearest centroid posture classifier over the yaw features of a fixed number
+    of tags. Predicting is a handful of float operations per tag, so it keeps
+    up with the sensors on the computer itself.
+    """
+
+    tags: int
+    good: list[float]
+    bad: list[float]
+
+    @classmethod
+    def fit(cls, good: np.ndarray, bad: np.ndarray) -> "CentroidClassifier":
+        """Fits to (N, tags) arrays of yaws logged in good and in bad posture"""
+        if not len(good) or not len(bad):
+            raise ValueError("Need yaws logged in both good and bad posture")
+        if good.shape[1] != bad.shape[1]:
+            raise ValueError("Good and bad yaws are from different numbers of tags")
+        return cls(
+            good.shape[1],
+            _circular_mean(np.array([features(row) for row in good.tolist()])),
+            _circular_mean(np.array([features(row) for row in bad.tolist()])),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "CentroidClassifier":
+        return cls.from_json(Path(path).read_text())
+
+    def save(self, path: Path):
+        Path(path).write_text(self.to_json() + "\n")
+
+    def predict(self, yaws: list[float]) -> tuple[Prediction, float] or None:
+        """
+        The prediction and a score from 0.5 when both centroids are as close to
+        1.0 when the yaws sit on one, or None for another number of tags
+        """
+        if len(yaws) != self.tags:
+            return None
+        values = features(yaws)
+        good = math.fsum(wrap_degrees(v - c) ** 2 for v, c in zip(values, self.good))
+        bad = math.fsum(wrap_degrees(v - c) ** 2 for v, c in zip(values, self.bad))
+        if good + bad == 0.0:
+            return Prediction.GOOD, 0.5
+        if good <= bad:
+            return Prediction.GOOD, bad / (good + bad)
+        return Prediction.BAD, good / (good + bad)
+
+
+def read_yaws(paths: list[Path]) -> np.ndarray:
+    """
+    Yaws from Logger CSVs, gzipped rotated files included, without the times
+    and without rows where a tag was missing
+    """
+    rows = [np.genfromtxt(path, delimiter=",", ndmin=2)[:, 1:] for path in paths]
+    rows = np.concatenate(rows)
+    return rows[~np.isnan(rows).any(axis=1)]
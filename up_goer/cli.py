@@ -1,23 +1,67 @@
-import asyncio
-from os import name
+import json
 from pathlib import Path
 
 import typer
-from bleak import BleakScanner
 
 from up_goer.cfg import cfg
-from up_goer.computer.computer import Computer
-from up_goer.gateway.gateway import Gateway
-from up_goer.logger.logger import Logger
-from up_goer.server_logger.server_logger import ServerLogger
-from up_goer.spammer.spammer import Spammer
+
+# Commands import the subsystems they use when they run, so that starting one
+# does not pay for bleak, paho, numpy and every other command's modules
 
 app = typer.Typer()
 gateway = typer.Typer()
 app.add_typer(gateway, name="gateway")
+bench = typer.Typer()
+app.add_typer(bench, name="bench")
+
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    settings: list[str] = typer.Option(
+        [],
+        "--set",
+        help="Override a setting as NAME=VALUE, e.g. GATEWAY_HOST=10.0.0.2.",
+    ),
+    metrics_port: int = typer.Option(
+        None, help="Serve the metrics for Prometheus on this port."
+    ),
+    publish_stats: float = typer.Option(
+        None, help="Publish the metrics on STATS_TOPIC every this many seconds."
+    ),
+    profile: Path = typer.Option(
+        None, help="Sample every thread while running and write a pstats file."
+    ),
+):
+    for setting in settings:
+        name, _, value = setting.partition("=")
+        try:
+            cfg.override(**{name: value})
+        except ValueError as error:
+            raise typer.BadParameter(str(error), param_hint="--set")
+
+    if metrics_port:
+        from up_goer.metrics.metrics import serve
+
+        serve(metrics_port)
+    if publish_stats:
+        from up_goer.metrics.metrics import publish_periodically
+        from up_goer.transport.transport import MqttTransport
+
+        transport = MqttTransport(cfg.STATS_HOST)
+        transport.loop_start()
+        publish_periodically(transport, cfg.STATS_TOPIC, publish_stats)
+    if profile:
+        from up_goer.metrics.profiler import SamplingProfiler
+
+        profiler = SamplingProfiler(profile)
+        profiler.start()
+        ctx.call_on_close(profiler.stop)
 
 
 async def _discover():
+    from bleak import BleakScanner
+
     devices = await BleakScanner.discover()
     for d in devices:
         print(d)
@@ -25,44 +69,632 @@ async def _discover():
 
 @app.command()
 def discover():
+    import asyncio
+
     asyncio.run(_discover())
 
 
+def _movement_period(period_ms: float, param_hint: str) -> int:
+    """period_ms in the firmware's 10 ms steps, saying so when that changes it"""
+    from up_goer.cc2650.cc2650 import movement_period
+
+    try:
+        period = movement_period(period_ms)
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint=param_hint)
+    if period != period_ms:
+        print(f"Movement period {period_ms:g} ms runs at {period} ms")
+    return period
+
+
+def _parse_periods(
+    addresses: list[str], period: int or None, tag_periods: list[str]
+) -> dict[str, int]:
+    period = _movement_period(period or cfg.MOVEMENT_PERIOD_MS, "--period")
+    periods = {address: period for address in addresses}
+    for tag_period in tag_periods:
+        address, _, value = tag_period.rpartition("=")
+        periods[address] = _movement_period(int(value), "--tag-period")
+    return periods
+
+
+PERIOD_OPTION = typer.Option(
+    None, help="Movement sensor notification period in ms, or MOVEMENT_PERIOD_MS."
+)
+TAG_PERIOD_OPTION = typer.Option(
+    [], help="Per tag notification period as ADDRESS=MS, may be repeated."
+)
+SESSION_OPTION = typer.Option(
+    None, help="Identifies this vest when one computer serves many."
+)
+BATCH_SIZE_OPTION = typer.Option(1, help="Samples published per MQTT message.")
+BATCH_LATENCY_OPTION = typer.Option(
+    0, help="Longest time in ms a sample waits for its batch to fill."
+)
+
+
 @gateway.command(name="all")
-def gateway_all():
-    gateway = Gateway([cfg.TAG_ADDRESS_1, cfg.TAG_ADDRESS_2, cfg.TAG_ADDRESS_3])
+def gateway_all(
+    binary: bool = typer.Option(False, help="Publish compact binary frames."),
+    period: int = PERIOD_OPTION,
+    tag_period: list[str] = TAG_PERIOD_OPTION,
+    batch_size: int = BATCH_SIZE_OPTION,
+    batch_latency: int = BATCH_LATENCY_OPTION,
+    session: str = SESSION_OPTION,
+):
+    import asyncio
+
+    from up_goer.gateway.gateway import Gateway
+
+    addresses = [cfg.TAG_ADDRESS_1, cfg.TAG_ADDRESS_2, cfg.TAG_ADDRESS_3]
+    periods = _parse_periods(addresses, period, tag_period)
+    gateway = Gateway(
+        addresses, binary, periods, batch_size, batch_latency / 1000, session
+    )
     asyncio.run(gateway.main())
 
 
 @gateway.command(name="single")
-def gateway_single(address: str):
-    gateway = Gateway([address])
+def gateway_single(
+    address: str,
+    binary: bool = typer.Option(False, help="Publish compact binary frames."),
+    period: int = PERIOD_OPTION,
+    batch_size: int = BATCH_SIZE_OPTION,
+    batch_latency: int = BATCH_LATENCY_OPTION,
+    session: str = SESSION_OPTION,
+):
+    import asyncio
+
+    from up_goer.gateway.gateway import Gateway
+
+    gateway = Gateway(
+        [address],
+        binary,
+        _parse_periods([address], period, []),
+        batch_size,
+        batch_latency / 1000,
+        session,
+    )
     asyncio.run(gateway.main())
 
 
+@gateway.command(name="simulate")
+def gateway_simulate(
+    tags: int = typer.Option(3, help="Simulated tags."),
+    rate: float = typer.Option(10.0, help="Notifications per second per tag."),
+    duration: float = typer.Option(10.0, help="Seconds to run for."),
+    motion: str = typer.Option("sway", help="sway or random."),
+    jitter: float = typer.Option(0.0, help="Most a period is stretched, e.g. 0.1."),
+    drop: float = typer.Option(0.0, help="Probability a notification is lost."),
+    disconnect_every: float = typer.Option(
+        None, help="Mean seconds between simulated disconnects."
+    ),
+    seed: int = typer.Option(None, help="Seed for repeatable runs."),
+    mqtt: bool = typer.Option(
+        False, help="Publish to the computer's broker instead of only counting."
+    ),
+    binary: bool = typer.Option(False, help="Publish compact binary frames."),
+    batch_size: int = BATCH_SIZE_OPTION,
+    batch_latency: int = BATCH_LATENCY_OPTION,
+    output: Path = typer.Option(None, help="Write the JSON summary to this file."),
+):
+    """Runs the gateway against simulated tags and reports its throughput"""
+    from up_goer.gateway.gateway import Gateway
+    from up_goer.simulator.simulator import CountingTransport, Simulator, simulate
+
+    if rate <= 0:
+        raise typer.BadParameter("Must be above 0", param_hint="--rate")
+    period = _movement_period(1000 / rate, "--rate")
+    print(f"[simulate] {tags} tags at {1000 / period:g} notifications/s each")
+    addresses = [f"SIM:{i:04d}" for i in range(tags)]
+    simulator = Simulator(motion, jitter, drop, disconnect_every, seed)
+    gateway = Gateway(
+        addresses,
+        binary,
+        {address: period for address in addresses},
+        batch_size,
+        batch_latency / 1000,
+        transport=None if mqtt else CountingTransport(),
+        client_class=simulator,
+    )
+    text = json.dumps(simulate(gateway, simulator, duration), indent=2)
+    if output is None:
+        print(text)
+    else:
+        output.write_text(text + "\n")
+
+
+VARIABLE_DT_OPTION = typer.Option(
+    True, help="Integrate over sample timestamps instead of the fixed sample period."
+)
+
+
+CLASSIFIER_OPTION = typer.Option(
+    None, help="Also classify posture locally with a model from train-classifier."
+)
+REMOTE_OPTION = typer.Option(True, help="Send the yaws to the server for predictions.")
+
+
+DEADBAND_OPTION = typer.Option(
+    0.0, help="Degrees any yaw must move before it is sent to the server again."
+)
+MIN_INTERVAL_OPTION = typer.Option(
+    0.0, help="Least seconds between yaws sent to the server."
+)
+MAX_INTERVAL_OPTION = typer.Option(
+    None, help="Most seconds between yaws sent to the server, as a heartbeat."
+)
+LOGGER_INTERVAL_OPTION = typer.Option(
+    0.0, help="Least seconds between yaws sent to the logger, 0 for every frame."
+)
+
+
+STATE_OPTION = typer.Option(
+    None, help="File the filter states are saved to and restored from on start."
+)
+INITIAL_ORIENTATION_OPTION = typer.Option(
+    False, help="Start new filters at the orientation of their first sample."
+)
+WINDOW_OPTION = typer.Option(
+    0, help="Frames in the feature window, 0 to publish no features."
+)
+FEATURE_INTERVAL_OPTION = typer.Option(
+    1.0, help="Seconds between feature vectors published on FEATURES_TOPIC."
+)
+
+
+def _policies(
+    deadband: float,
+    min_interval: float,
+    max_interval: float or None,
+    logger_interval: float,
+) -> dict:
+    from up_goer.computer.computer import PublishPolicy
+
+    policies = {}
+    if deadband or min_interval or max_interval:
+        policies[cfg.CLASSIFY_TOPIC] = PublishPolicy(
+            deadband, min_interval, max_interval
+        )
+    if logger_interval:
+        policies[cfg.LOGGER_TOPIC] = PublishPolicy(min_interval=logger_interval)
+    return policies
+
+
+def _load_classifier(path: Path or None):
+    if path is None:
+        return None
+    from up_goer.classifier.classifier import CentroidClassifier
+
+    return CentroidClassifier.load(path)
+
+
+@app.command()
+def computer(
+    bank: bool = typer.Option(
+        False, help="Update every tag in one vectorised MadgwickAHRSBank step."
+    ),
+    workers: int = typer.Option(
+        0,
+        help="Shard sessions over this many worker processes, 0 to run inline. "
+        "Binary frames are routed from their header, JSON ones are parsed.",
+    ),
+    pipeline: bool = typer.Option(
+        False, help="Compute on a separate thread from the MQTT network loop."
+    ),
+    queue_size: int = typer.Option(
+        1000, help="Frames queued in pipelined mode, or per worker with --workers."
+    ),
+    overflow: str = typer.Option(
+        "block", help="When the queue is full: block, drop-oldest or coalesce."
+    ),
+    stats_interval: float = typer.Option(
+        10.0, help="Seconds between queue and publishing statistics."
+    ),
+    variable_dt: bool = VARIABLE_DT_OPTION,
+    classifier: Path = CLASSIFIER_OPTION,
+    remote: bool = REMOTE_OPTION,
+    deadband: float = DEADBAND_OPTION,
+    min_interval: float = MIN_INTERVAL_OPTION,
+    max_interval: float = MAX_INTERVAL_OPTION,
+    logger_interval: float = LOGGER_INTERVAL_OPTION,
+    state: Path = STATE_OPTION,
+    snapshot_interval: float = typer.Option(
+        5.0, help="Seconds between saves of the filter states."
+    ),
+    initial_orientation: bool = INITIAL_ORIENTATION_OPTION,
+    window: int = WINDOW_OPTION,
+    feature_interval: float = FEATURE_INTERVAL_OPTION,
+):
+    from up_goer.computer.computer import (
+        Computer,
+        ComputerOptions,
+        PipelinedComputer,
+        ShardedComputer,
+    )
+
+    options = ComputerOptions(
+        bank=bank,
+        variable_dt=variable_dt,
+        classifier=_load_classifier(classifier),
+        remote=remote,
+        policies=_policies(deadband, min_interval, max_interval, logger_interval),
+        stats_interval=stats_interval,
+        state=state,
+        snapshot_interval=snapshot_interval,
+        initial_orientation=initial_orientation,
+        window=window,
+        feature_interval=feature_interval,
+    )
+    if pipeline:
+        computer = PipelinedComputer(options, queue_size, overflow)
+    elif workers:
+        computer = ShardedComputer(workers, options, queue_size)
+    else:
+        computer = Computer(options)
+    try:
+        computer.gateway_subscriber.loop_forever()
+    finally:
+        computer.close()
+
+
+def _show_changes():
+    """Prints local predictions whenever the posture changes"""
+    shown = []
+
+    def show(data):
+        if shown and shown[-1] == data.prediction:
+            return
+        shown[:] = [data.prediction]
+        print(f"[posture] {data.prediction.name} score={data.score:.2f}")
+
+    return show
+
+
+async def _run_local(transport, gateway):
+    import asyncio
+
+    await asyncio.gather(transport.run(), gateway.main())
+
+
 @app.command()
-def computer():
-    computer = Computer()
-    computer.gateway_subscriber.loop_forever()
+def local(
+    period: int = PERIOD_OPTION,
+    tag_period: list[str] = TAG_PERIOD_OPTION,
+    batch_size: int = BATCH_SIZE_OPTION,
+    batch_latency: int = BATCH_LATENCY_OPTION,
+    session: str = SESSION_OPTION,
+    bank: bool = typer.Option(
+        False, help="Update every tag in one vectorised MadgwickAHRSBank step."
+    ),
+    variable_dt: bool = VARIABLE_DT_OPTION,
+    csv: Path = typer.Option(None, help="Also log the yaws to this CSV file."),
+    classifier: Path = CLASSIFIER_OPTION,
+    remote: bool = REMOTE_OPTION,
+    deadband: float = DEADBAND_OPTION,
+    min_interval: float = MIN_INTERVAL_OPTION,
+    max_interval: float = MAX_INTERVAL_OPTION,
+    logger_interval: float = LOGGER_INTERVAL_OPTION,
+    state: Path = STATE_OPTION,
+    initial_orientation: bool = INITIAL_ORIENTATION_OPTION,
+    window: int = WINDOW_OPTION,
+    feature_interval: float = FEATURE_INTERVAL_OPTION,
+):
+    """Runs the gateway, computer and optionally the logger in one process"""
+    import asyncio
+
+    from up_goer.computer.computer import Computer, ComputerOptions
+    from up_goer.gateway.gateway import Gateway
+    from up_goer.logger.logger import CsvWriter, Logger
+    from up_goer.transport.transport import LocalTransport, MqttTransport
+
+    addresses = [cfg.TAG_ADDRESS_1, cfg.TAG_ADDRESS_2, cfg.TAG_ADDRESS_3]
+    periods = _parse_periods(addresses, period, tag_period)
+    # Frames and log rows stay in process, only the yaws go to the server
+    transport = LocalTransport()
+    model = None
+    if remote:
+        model = MqttTransport(cfg.HOST, cfg.USER, cfg.PASSWORD, connect=False)
+    options = ComputerOptions(
+        bank=bank,
+        variable_dt=variable_dt,
+        classifier=_load_classifier(classifier),
+        remote=remote,
+        policies=_policies(deadband, min_interval, max_interval, logger_interval),
+        state=state,
+        initial_orientation=initial_orientation,
+        window=window,
+        feature_interval=feature_interval,
+    )
+    computer = Computer(options, gateway=transport, model=model, logger=transport)
+    if model:
+        model.loop_start()
+    if classifier:
+        transport.subscribe(cfg.PREDICT_TOPIC, _show_changes())
+    logger = Logger(CsvWriter(csv), transport=transport) if csv else None
+    gateway = Gateway(
+        addresses,
+        periods=periods,
+        batch_size=batch_size,
+        batch_latency=batch_latency / 1000,
+        session=session,
+        transport=transport,
+    )
+    try:
+        asyncio.run(_run_local(transport, gateway))
+    finally:
+        computer.close()
+        if logger:
+            logger.close()
 
 
 @app.command()
-def generate_csv(filename: Path):
-    logger = Logger(filename)
-    logger.computer_subscriber.loop_forever()
+def train_classifier(
+    output: Path,
+    good: list[Path] = typer.Option(..., help="CSV logged in good posture."),
+    bad: list[Path] = typer.Option(..., help="CSV logged in bad posture."),
+):
+    """Fits a local posture classifier to yaws logged by generate-csv"""
+    from up_goer.classifier.classifier import CentroidClassifier, read_yaws
+
+    model = CentroidClassifier.fit(read_yaws(good), read_yaws(bad))
+    model.save(output)
+    print(f"Saved a classifier for {model.tags} tags to {output}")
 
 
 @app.command()
-def spam_server(filename: Path):
-    spammer = Spammer()
-    spammer.blast(filename)
+def generate_csv(
+    filename: Path,
+    flush_size: int = typer.Option(64 * 1024, help="Bytes buffered before a write."),
+    flush_interval: float = typer.Option(1.0, help="Seconds between writes."),
+    rotate_size: int = typer.Option(
+        None, help="Rotate the file after this many bytes."
+    ),
+    rotate_interval: float = typer.Option(
+        None, help="Rotate the file every N seconds."
+    ),
+    gzip: bool = typer.Option(False, help="Compress rotated files."),
+    status_interval: float = typer.Option(
+        1.0, help="Seconds between status lines, 0 to disable."
+    ),
+    index_interval: float = typer.Option(
+        1.0, help="Seconds between rows indexed for query, 0 for no index."
+    ),
+):
+    from up_goer.logger.logger import CsvWriter, Logger
+
+    writer = CsvWriter(
+        filename,
+        flush_size,
+        flush_interval,
+        rotate_size,
+        rotate_interval,
+        gzip,
+        index_interval,
+    )
+    logger = Logger(writer, status_interval)
+    try:
+        logger.computer_subscriber.loop_forever()
+    finally:
+        logger.close()
+
+
+def _parse_time(value: str or None) -> float or None:
+    """Seconds since the epoch, or an ISO 8601 date and time in local time"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    from datetime import datetime
+
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise typer.BadParameter(f"Not a timestamp or ISO 8601 time: {value}")
 
 
 @app.command()
-def observe_server():
-    observer = ServerLogger()
+def index_csv(
+    filenames: list[Path],
+    interval: float = typer.Option(1.0, help="Seconds between indexed rows."),
+):
+    """Indexes CSV logs written without an index, for query"""
+    from up_goer.index.index import build_index
+
+    for filename in filenames:
+        print(f"Indexed {build_index(filename, interval)} rows of {filename}")
+
+
+@app.command()
+def query(
+    filenames: list[Path],
+    start: str = typer.Option(
+        None, help="Epoch seconds or ISO 8601 time of the first row."
+    ),
+    end: str = typer.Option(
+        None, help="Epoch seconds or ISO 8601 time of the last row."
+    ),
+    every: float = typer.Option(None, help="Keep one row per this many seconds."),
+    workers: int = typer.Option(1, help="Processes to spread the files over."),
+    output: Path = typer.Option(None, help="Write the rows here, not to stdout."),
+):
+    """Prints the rows of CSV logs in a time range, using their indexes"""
+    import sys
+
+    from up_goer.index.index import query_files
+
+    start, end = _parse_time(start), _parse_time(end)
+    if output is None:
+        query_files(filenames, sys.stdout.buffer, start, end, every, workers)
+        return
+    with open(output, "wb") as file:
+        rows = query_files(filenames, file, start, end, every, workers)
+    print(f"Wrote {rows} rows to {output}")
+
+
+@app.command()
+def generate_store(
+    directory: Path,
+    segment_records: int = typer.Option(1 << 20, help="Records per segment file."),
+    status_interval: float = typer.Option(
+        1.0, help="Seconds between status lines, 0 to disable."
+    ),
+    raw: bool = typer.Option(
+        False, help="Also store every tag's latest sensor data from the gateway."
+    ),
+):
+    from up_goer.logger.logger import Logger
+    from up_goer.store.store import StoreWriter
+
+    writer = StoreWriter(directory, segment_records)
+    logger = Logger(writer, status_interval, raw=raw)
+    try:
+        logger.computer_subscriber.loop_forever()
+    finally:
+        logger.close()
+
+
+@app.command()
+def convert_to_store(filenames: list[Path], directory: Path):
+    from up_goer.store.store import convert_csv
+
+    for filename in filenames:
+        rows = convert_csv(filename, directory)
+        print(f"Converted {rows} rows from {filename}")
+
+
+@app.command()
+def record_gateway(filename: Path):
+    from up_goer.replay.replay import Recorder
+
+    recorder = Recorder(filename)
+    recorder.gateway_subscriber.loop_forever()
+
+
+@app.command()
+def replay(
+    filenames: list[Path],
+    output: Path = typer.Option(Path("replay"), help="Directory for the yaw CSVs."),
+    beta: float = typer.Option(None, help="Filter gain, or the BETA setting."),
+    sample_period: float = typer.Option(
+        None, help="Seconds, or the SAMPLE_PERIOD setting."
+    ),
+    chunk_size: int = typer.Option(4096, help="Frames read from disk at a time."),
+    workers: int = typer.Option(1, help="Processes to spread the files over."),
+    bank: bool = typer.Option(False, help="Use the vectorised MadgwickAHRSBank."),
+    variable_dt: bool = VARIABLE_DT_OPTION,
+):
+    from up_goer.replay.replay import Replayer
+
+    replayer = Replayer(sample_period, beta, chunk_size, bank, variable_dt)
+    replayer.run(filenames, output, workers)
+
+
+@app.command()
+def spam_server(
+    filename: Path,
+    rate: float = typer.Option(10.0, help="Messages per second."),
+    speed: float = typer.Option(
+        None, help="Replay at this multiple of the recorded timestamps instead."
+    ),
+    unthrottled: bool = typer.Option(False, help="Publish as fast as possible."),
+    bulk: bool = typer.Option(False, help="Parse and encode the file up front."),
+    qos: int = typer.Option(0, min=0, max=2),
+    window: int = typer.Option(100, help="Most messages in flight at once."),
+):
+    from up_goer.spammer.spammer import Spammer
+
+    spammer = Spammer(qos, window)
+    spammer.blast(filename, None if unthrottled else rate, speed, bulk)
+
+
+@app.command()
+def observe_server(
+    report_interval: float = typer.Option(
+        10.0, help="Seconds between latency reports."
+    ),
+    max_pending: int = typer.Option(10000, help="Most sent data awaiting predictions."),
+    max_age: float = typer.Option(
+        30.0, help="Seconds after which a missing prediction is counted as lost."
+    ),
+    stale_after: float = typer.Option(
+        2.0, help="Seconds after which a late prediction is dropped."
+    ),
+):
+    from up_goer.server_logger.server_logger import ServerLogger
+
+    observer = ServerLogger(report_interval, max_pending, max_age, stale_after)
     observer.server_subscriber.loop_forever()
 
 
+def _report(results: dict, output: Path or None):
+    from up_goer.bench import bench as benchmarks
+
+    results = {"environment": benchmarks.environment(), **results}
+    text = json.dumps(results, indent=2)
+    if output is None:
+        print(text)
+    else:
+        output.write_text(text + "\n")
+
+
+OUTPUT_OPTION = typer.Option(None, help="Write the JSON results to this file.")
+
+
+@bench.command(name="all")
+def bench_all(tags: int = 3, output: Path = OUTPUT_OPTION):
+    from up_goer.bench import bench as benchmarks
+
+    _report(benchmarks.bench_all(tags), output)
+
+
+@bench.command(name="ahrs")
+def bench_ahrs(samples: int = 2000, tags: int = 3, output: Path = OUTPUT_OPTION):
+    from up_goer.bench import bench as benchmarks
+
+    _report({"ahrs": benchmarks.bench_ahrs(samples, tags)}, output)
+
+
+@bench.command(name="wire")
+def bench_wire(frames: int = 10000, tags: int = 3, output: Path = OUTPUT_OPTION):
+    from up_goer.bench import bench as benchmarks
+
+    _report({"wire": benchmarks.bench_wire(frames, tags)}, output)
+
+
+@bench.command(name="classifying")
+def bench_classifying(
+    messages: int = 10000, tags: int = 3, output: Path = OUTPUT_OPTION
+):
+    from up_goer.bench import bench as benchmarks
+
+    _report({"classifying": benchmarks.bench_classifying(messages, tags)}, output)
+
+
+@bench.command(name="notifications")
+def bench_notifications(notifications: int = 50000, output: Path = OUTPUT_OPTION):
+    from up_goer.bench import bench as benchmarks
+
+    _report({"notifications": benchmarks.bench_notifications(notifications)}, output)
+
+
+@bench.command(name="startup")
+def bench_startup(repeats: int = 5, output: Path = OUTPUT_OPTION):
+    from up_goer.bench import bench as benchmarks
+
+    _report({"startup": benchmarks.bench_startup(repeats)}, output)
+
+
+@bench.command(name="computer")
+def bench_computer(
+    frames: int = 5000, tags: int = 3, bank: bool = False, output: Path = OUTPUT_OPTION
+):
+    from up_goer.bench import bench as benchmarks
+
+    _report({"computer": benchmarks.bench_computer(frames, tags, bank)}, output)
+
+
 if __name__ == "__main__":
     app()
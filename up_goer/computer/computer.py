@@ -1,57 +1,893 @@
-from paho.mqtt.client import Client
-from up_goer.ahrs.ahrs import MadgwickAHRS, get_yaw
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import numpy as np
+from up_goer.ahrs.ahrs import (
+    MadgwickAHRS,
+    MadgwickAHRSBank,
+    get_angles,
+    get_yaw,
+    get_yaws,
+    initial_quaternion,
+    wrap_degrees,
+)
 from up_goer.cfg import cfg
-from up_goer.core.data_structures import ClassifyingData, GatewayData
+from up_goer.core import wire
+from up_goer.classifier.classifier import CentroidClassifier
+from up_goer.core.data_structures import (
+    ClassifyingData,
+    GatewayData,
+    Mock,
+    Prediction,
+    PredictingData,
+)
+from up_goer.features.features import FeatureStage
+from up_goer.metrics.metrics import REGISTRY
+from up_goer.transport.transport import MqttTransport, Transport
 
 
-class Computer:
-    def __init__(self):
+class Filters:
+    """
+    Per-tag orientation filters, keyed by whatever identifies a tag in a frame.
+    With variable_dt each sample is integrated over the time since the previous
+    sample of its tag instead of the fixed sample period. New filters start from
+    their state in saved if there is one, otherwise with initial from the
+    orientation of their first accelerometer and magnetometer sample. A filter
+    has no yaw until its tag has sent a sample or its state was restored.
+    """
+
+    def __init__(
+        self,
+        sample_period: float,
+        beta: float,
+        variable_dt: bool = True,
+        initial: bool = False,
+        saved: dict = None,
+    ):
+        self.sample_period = sample_period
+        self.beta = beta
+        self.variable_dt = variable_dt
+        self.initial = initial
+        # Quaternion and timestamp per key, for filters not created yet
+        self.saved = dict(saved or {})
+        # Keys waiting for their first sample to set their orientation
+        self.fresh = set()
+        # Keys with an orientation, from a sample or a saved state
+        self.live = set()
+        # Set once the gateway's tags are registered, until then the order of
+        # the yaws is only the order tags happened to send samples in
+        self.announced = False
+        # Keys with a sample since the last complete round of every tag
+        self.updated = set()
+
+    def __contains__(self, key) -> bool:
+        raise NotImplementedError
+
+    def _add(self, key):
+        raise NotImplementedError
+
+    def register(self, keys: list):
+        """Creates filters for unseen keys, in the order given"""
+        for key in keys:
+            if key in self:
+                continue
+            self._add(key)
+            state = self.saved.pop(key, None)
+            if state is not None:
+                self.restore(key, *state)
+                self.live.add(key)
+            elif self.initial:
+                self.fresh.add(key)
+
+    def announce(self, tags: list):
+        """Registers every tag of the gateway, in the gateway's order"""
+        self.register(tags)
+        self.announced = True
+
+    def completes_round(self) -> bool:
+        """
+        Tells whether every tag has sent a sample since the last time this was
+        true, so that tags notifying one at a time give one set of yaws per
+        notification period rather than one per notification
+        """
+        if not self.updated.issuperset(self.keys()):
+            return False
+        self.updated.clear()
+        return True
+
+    def restore(self, key, quaternion: list[float], timestamp: float or None):
+        raise NotImplementedError
+
+    def states(self) -> dict:
+        """Quaternion and timestamp per key, for restore"""
+        raise NotImplementedError
+
+    def _start(self, keys: list, values):
+        """Sets the orientation of fresh filters from their first usable sample"""
+        for key, row in zip(keys, values):
+            if key not in self.fresh:
+                continue
+            quaternion = initial_quaternion(*map(float, row[3:9]))
+            if quaternion is not None:
+                self.restore(key, quaternion, None)
+                self.fresh.discard(key)
+
+    def update(self, keys: list, values, timestamps=None):
+        """Feeds values to the filters of keys in order, keys may repeat"""
+        raise NotImplementedError
+
+    def keys(self) -> list:
+        """Keys in the order of the yaws"""
+        raise NotImplementedError
+
+    def yaws(self) -> list[float]:
+        raise NotImplementedError
+
+    def quaternions(self) -> np.ndarray:
+        """(tags, 4) quaternions in the order of the yaws"""
+        raise NotImplementedError
+
+    def process(
+        self, keys: list, values, timestamps=None, missing: list = None
+    ) -> list[float or None] or None:
+        """
+        Updates the filters of the given tags and returns the yaws of every tag,
+        None for tags without a sample yet and for missing ones, whose filters
+        hold the orientation they had when they dropped. Returns None while no
+        tag has a yaw. Batched frames are fed to the filters in timestamp order.
+        """
+        # tags are registered in frame order, which fixes the order of the yaws
+        self.register(keys)
+        if timestamps is not None and len(keys) > 1:
+            order = np.argsort(timestamps, kind="stable")
+            keys = [keys[i] for i in order]
+            values = np.asarray(values)[order]
+            timestamps = np.asarray(timestamps)[order]
+        if not self.variable_dt:
+            timestamps = None
+        if self.fresh:
+            self._start(keys, values)
+        self.update(keys, values, timestamps)
+        self.live.update(keys)
+        self.updated.update(keys)
+        missing = set(missing or ())
+        yaws = [
+            yaw if key in self.live and key not in missing else None
+            for key, yaw in zip(self.keys(), self.yaws())
+        ]
+        if all(yaw is None for yaw in yaws):
+            return None
+        return yaws
+
+
+class ScalarFilters(Filters):
+    """One pure-Python MadgwickAHRS per tag, updated one tag at a time."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
         self.sensor_tag_dict: dict[str, MadgwickAHRS] = dict()
-        self.gateway_subscriber = Client()
-        self.gateway_subscriber.on_connect = self.on_connect
-        self.gateway_subscriber.on_message = self.on_message
-        self.gateway_subscriber.connect(cfg.GATEWAY_HOST)
 
-        self.model_publisher = Client()
-        self.model_publisher.username_pw_set(cfg.USER, cfg.PASSWORD)
-        self.model_publisher.connect(cfg.HOST)
+    def __contains__(self, key) -> bool:
+        return key in self.sensor_tag_dict
+
+    def _add(self, key):
+        self.sensor_tag_dict[key] = MadgwickAHRS(self.sample_period, self.beta)
+
+    def restore(self, key, quaternion: list[float], timestamp: float or None):
+        ahrs = self.sensor_tag_dict[key]
+        ahrs.quaternion = [float(value) for value in quaternion]
+        ahrs.timestamp = timestamp
+
+    def states(self) -> dict:
+        return {
+            key: (list(ahrs.quaternion), ahrs.timestamp)
+            for key, ahrs in self.sensor_tag_dict.items()
+        }
+
+    def update(self, keys: list, values, timestamps=None):
+        if isinstance(values, np.ndarray):
+            # python floats keep the scalar filter in double precision
+            values = values.tolist()
+        if len(keys) == 1:
+            ahrs = self.sensor_tag_dict[keys[0]]
+            if timestamps is None:
+                ahrs.update(*values[0])
+            else:
+                ahrs.update_at(float(timestamps[0]), *values[0])
+            return
+        # Tags are independent, so each one integrates its block in one call
+        blocks = dict()
+        for i, key in enumerate(keys):
+            blocks.setdefault(key, []).append(i)
+        for key, rows in blocks.items():
+            self.sensor_tag_dict[key].update_many(
+                [values[i] for i in rows],
+                None if timestamps is None else [float(timestamps[i]) for i in rows],
+            )
+
+    def keys(self) -> list:
+        return list(self.sensor_tag_dict)
+
+    def yaws(self) -> list[float]:
+        # dicts in python preserve insertion order
+        return [get_yaw(*ahrs.quaternion) for ahrs in self.sensor_tag_dict.values()]
+
+    def quaternions(self) -> np.ndarray:
+        return np.array([ahrs.quaternion for ahrs in self.sensor_tag_dict.values()])
+
+
+class BankFilters(Filters):
+    """All tags in a single MadgwickAHRSBank, updated in one vectorised step."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bank = MadgwickAHRSBank(self.sample_period, self.beta)
+        self.index: dict[str, int] = dict()
+
+    def __contains__(self, key) -> bool:
+        return key in self.index
+
+    def _add(self, key):
+        self.index[key] = self.bank.add()
+
+    def restore(self, key, quaternion: list[float], timestamp: float or None):
+        row = self.index[key]
+        self.bank.quaternions[row] = quaternion
+        self.bank.timestamps[row] = np.nan if timestamp is None else timestamp
+
+    def states(self) -> dict:
+        states = dict()
+        for key, row in self.index.items():
+            timestamp = self.bank.timestamps[row]
+            states[key] = (
+                self.bank.quaternions[row].tolist(),
+                None if np.isnan(timestamp) else float(timestamp),
+            )
+        return states
+
+    def update(self, keys: list, values, timestamps=None):
+        values = np.asarray(values)
+        index = np.fromiter((self.index[key] for key in keys), dtype=np.intp)
+
+        def step(start: int, end: int):
+            if timestamps is None:
+                self.bank.update(values[start:end], index[start:end])
+            else:
+                self.bank.update_at(
+                    values[start:end], timestamps[start:end], index[start:end]
+                )
+
+        # A bank step updates each row once, so split at every repeated tag
+        start = 0
+        seen = set()
+        for i, key in enumerate(keys):
+            if key in seen:
+                step(start, i)
+                start = i
+                seen.clear()
+            seen.add(key)
+        step(start, len(keys))
+
+    def keys(self) -> list:
+        return list(self.index)
+
+    def yaws(self) -> list[float]:
+        # rows are appended in insertion order, same as ScalarFilters
+        return get_yaws(self.bank.quaternions).tolist()
+
+    def quaternions(self) -> np.ndarray:
+        return self.bank.quaternions
+
+
+class Snapshots:
+    """
+    Filter states of every session in a small JSON file, so that a restarted
+    computer carries on from the orientations it had. Saving writes a new file
+    and renames it over the old one, so a crash never leaves half a file.
+    """
+
+    def __init__(self, path: Path, interval: float = 5.0):
+        self.path = Path(path)
+        self.interval = interval
+        self.saved_at = time.time()
+        # Restored states of sessions that have not sent frames yet
+        self.states = dict[str or None, dict]()
+        if self.path.exists():
+            for record in json.loads(self.path.read_text()):
+                session = self.states.setdefault(record["session"], dict())
+                session[record["tag"]] = (record["quaternion"], record["timestamp"])
+
+    def pop(self, session: str or None) -> dict:
+        return self.states.pop(session, dict())
+
+    def save(self, sessions: dict[str or None, Filters]):
+        records = []
+        states = {**self.states, **{s: f.states() for s, f in sessions.items()}}
+        for session, tags in states.items():
+            for tag, (quaternion, timestamp) in tags.items():
+                records.append(
+                    {
+                        "session": session,
+                        "tag": tag,
+                        "quaternion": quaternion,
+                        "timestamp": timestamp,
+                    }
+                )
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        temporary.write_text(json.dumps(records))
+        os.replace(temporary, self.path)
+        self.saved_at = time.time()
+
+    def save_due(self, sessions: dict[str or None, Filters], now: float):
+        if now - self.saved_at >= self.interval:
+            self.save(sessions)
+
+
+def _session_of(payload: bytes) -> str or None:
+    """
+    Session of a frame, read from the header of binary frames. JSON frames are
+    parsed whole to find it, on the network thread, so sharding is best fed
+    binary frames.
+    """
+    if wire.is_binary(payload):
+        return wire.decode_session(payload)
+    return json.loads(payload).get("session")
+
 
-        self.logger_publisher = Client()
-        self.logger_publisher.connect(cfg.LOGGER_HOST)
+def shard_of(session: str or None, shards: int) -> int:
+    """Stable across processes and runs, unlike hash()"""
+    return zlib.crc32((session or "").encode()) % shards
 
-    def on_connect(self, client: Client, userdata, flags, result_code):
-        if client is not self.gateway_subscriber:
+
+class PublishPolicy:
+    """
+    Decides per session whether new yaws are worth publishing on a topic. They
+    are once any yaw moved by deadband degrees since the last published ones,
+    but never within min_interval seconds of it. After max_interval seconds
+    they are published anyway as a heartbeat.
+    """
+
+    def __init__(
+        self,
+        deadband: float = 0.0,
+        min_interval: float = 0.0,
+        max_interval: float = None,
+    ):
+        self.deadband = deadband
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # Last published yaws and their time per session
+        self.published: dict[str or None, tuple[list[float], float]] = dict()
+        self.considered = 0
+        self.changes = 0
+        self.heartbeats = 0
+
+    def _moved(self, yaws: list[float], last_yaws: list[float]) -> bool:
+        if len(yaws) != len(last_yaws):
+            return True
+        # A tag dropping or coming back is a change
+        return any(
+            (yaw is None) != (last_yaw is None)
+            or (yaw is not None and abs(wrap_degrees(yaw - last_yaw)) >= self.deadband)
+            for yaw, last_yaw in zip(yaws, last_yaws)
+        )
+
+    def allows(self, session: str or None, yaws: list[float], now: float) -> bool:
+        self.considered += 1
+        last = self.published.get(session)
+        if last is None:
+            self.changes += 1
+        else:
+            last_yaws, published_at = last
+            elapsed = now - published_at
+            if elapsed < self.min_interval:
+                return False
+            if self._moved(yaws, last_yaws):
+                self.changes += 1
+            elif self.max_interval is not None and elapsed >= self.max_interval:
+                self.heartbeats += 1
+            else:
+                return False
+        self.published[session] = (yaws, now)
+        return True
+
+    def summary(self) -> dict:
+        published = self.changes + self.heartbeats
+        return {
+            "considered": self.considered,
+            "published": published,
+            "heartbeats": self.heartbeats,
+            "reduction": 1 - published / self.considered if self.considered else 0.0,
+        }
+
+
+@dataclass
+class ComputerOptions:
+    """
+    How frames are computed and published, shared by every kind of computer.
+    bank updates every tag in one MadgwickAHRSBank step. With a classifier,
+    predictions are also made locally and published next to the logger data,
+    and remote=False stops sending the yaws to the server. policies maps
+    topics to the PublishPolicy limiting what is published on them, topics
+    without one get every frame. Filter states are restored from and saved
+    every snapshot_interval to the state file, if given, and
+    initial_orientation starts other filters from their first sample. A window
+    of frames publishes their statistics every feature_interval seconds, and
+    the classifier then decides on those instead of each frame.
+    """
+
+    bank: bool = False
+    variable_dt: bool = True
+    classifier: CentroidClassifier = None
+    remote: bool = True
+    policies: dict[str, PublishPolicy] = None
+    stats_interval: float = 10.0
+    state: Path = None
+    snapshot_interval: float = 5.0
+    initial_orientation: bool = False
+    window: int = 0
+    feature_interval: float = 1.0
+
+
+class Computer:
+    def __init__(
+        self,
+        options: ComputerOptions = None,
+        connect: bool = True,
+        gateway: Transport = None,
+        model: Transport = None,
+        logger: Transport = None,
+    ):
+        """
+        connect=False leaves the clients disconnected, for benchmarks. Transports
+        that are not given are MQTT clients to the configured brokers.
+        """
+        options = options or ComputerOptions()
+        self.filters_class = BankFilters if options.bank else ScalarFilters
+        self.variable_dt = options.variable_dt
+        self.initial_orientation = options.initial_orientation
+        self.snapshots = None
+        if options.state:
+            self.snapshots = Snapshots(options.state, options.snapshot_interval)
+        # Orientation filters per session, frames without a session share None
+        self.sessions: dict[str or None, Filters] = dict()
+        self.window = options.window
+        self.feature_interval = options.feature_interval
+        self.features: dict[str or None, FeatureStage] = dict()
+        self.gateway_subscriber = gateway or MqttTransport(
+            cfg.GATEWAY_HOST, connect=connect
+        )
+        self.gateway_subscriber.subscribe(cfg.GATEWAY_TOPIC, self.on_frame)
+
+        self.classifier = options.classifier
+        self.policies = options.policies or {}
+        self.stats_interval = options.stats_interval
+        self.reported_at = time.time()
+        self.model_publisher = None
+        if options.remote:
+            self.model_publisher = model or MqttTransport(
+                cfg.HOST, cfg.USER, cfg.PASSWORD, connect=False
+            )
+        self.logger_publisher = logger or MqttTransport(cfg.LOGGER_HOST, connect=False)
+
+        self.frames = REGISTRY.counter("computer_frames_total")
+        self.decode_time = REGISTRY.histogram("computer_decode_seconds")
+        self.ahrs_time = REGISTRY.histogram("computer_ahrs_seconds")
+        self.publish_time = REGISTRY.histogram("computer_publish_seconds")
+        self.published = {
+            topic: REGISTRY.counter("computer_messages_total", topic=topic)
+            for topic in (
+                cfg.CLASSIFY_TOPIC,
+                cfg.LOGGER_TOPIC,
+                cfg.PREDICT_TOPIC,
+                cfg.FEATURES_TOPIC,
+            )
+        }
+
+        if connect:
+            self.connect_publishers()
+
+    def close(self):
+        if self.snapshots:
+            self.snapshots.save(self.sessions)
+
+    def connect_publishers(self):
+        if self.model_publisher:
+            self.model_publisher.connect()
+        self.logger_publisher.connect()
+
+    def on_frame(self, message: bytes or GatewayData):
+        self.handle(message, time.time())
+
+    def handle(self, payload: bytes or GatewayData, received: float):
+        self.frames.inc()
+        if isinstance(payload, GatewayData):
+            # from an in-process transport, nothing to decode
+            self._parse(payload, received)
             return
-        client.subscribe(cfg.GATEWAY_TOPIC)
+        start = time.perf_counter()
+        if wire.is_binary(payload):
+            frame = wire.decode(payload)
+            timestamps = frame.timestamp + frame.records["offset"].astype(np.float64)
+            trace = [float(timestamps.max()), frame.published, received]
+            keys, missing = wire.tag_keys(frame)
+            axes = frame.records["axes"]
+            self.decode_time.record(time.perf_counter() - start)
+            if frame.tags is None and keys:
+                # Tag indices are the gateway's order, lower ones go first even
+                # before they have sent a sample
+                self._filters(frame.session).register(range(max(keys) + 1))
+            self._compute(
+                frame.session, keys, axes, timestamps, trace, frame.tags, missing
+            )
+            return
+        data = GatewayData.from_json(payload.decode())
+        self.decode_time.record(time.perf_counter() - start)
+        self._parse(data, received)
+
+    def _parse(self, data: GatewayData, received: float = None):
+        keys = [tag.address for tag in data.sensor_tags]
+        values = [
+            (*tag.gyroscope, *tag.accelerometer, *tag.magnetometer)
+            for tag in data.sensor_tags
+        ]
+        timestamps = [tag.timestamp for tag in data.sensor_tags]
+        trace = [max(timestamps), data.published, received]
+        self._compute(
+            data.session, keys, values, timestamps, trace, data.tags, data.missing
+        )
 
-    def on_message(self, client: Client, userdata, message):
-        if client is not self.gateway_subscriber:
+    def _compute(
+        self,
+        session: str,
+        keys: list,
+        values,
+        timestamps,
+        trace: list,
+        tags: list = None,
+        missing: list = None,
+    ):
+        filters = self._filters(session)
+        if tags is not None:
+            # the gateway's tag order, even for tags that have not sent data yet
+            filters.announce(tags)
+        start = time.perf_counter()
+        yaws = filters.process(keys, values, timestamps, missing)
+        self.ahrs_time.record(time.perf_counter() - start)
+        if yaws is None:
             return
-        if message.topic != cfg.GATEWAY_TOPIC:
+        # The logger records every frame and its gaps, the classifiers get
+        # every tag's yaw in the gateway's order, once per round of samples
+        complete = filters.announced and None not in yaws and filters.completes_round()
+
+        now = time.time()
+        if self.snapshots:
+            self.snapshots.save_due(self.sessions, now)
+        if self.window and complete:
+            self._features(session, filters, trace[0])
+        publishers = [
+            (transport, topic)
+            for transport, topic in (
+                (self.model_publisher if complete else None, cfg.CLASSIFY_TOPIC),
+                (self.logger_publisher, cfg.LOGGER_TOPIC),
+            )
+            if transport is not None and self._allows(topic, session, yaws, now)
+        ]
+        if self.policies and self.stats_interval:
+            if now - self.reported_at >= self.stats_interval:
+                self.reported_at = now
+                self.report_publishing()
+        # With features the classifier decides on the windows instead
+        predict = self.classifier is not None and not self.window and complete
+        if not publishers and not predict:
             return
-        payload = message.payload.decode()
-        data = GatewayData.from_json(payload)
-        self._parse(data)
-
-    def _parse(self, data: GatewayData):
-        for data in data.sensor_tags:
-            if data.address not in self.sensor_tag_dict:
-                self.sensor_tag_dict[data.address] = MadgwickAHRS(
-                    cfg.SAMPLE_PERIOD, cfg.BETA
+
+        trace.append(now)
+        data = ClassifyingData(yaws, trace=trace, session=session)
+        payload = None
+        start = time.perf_counter()
+        for transport, topic in publishers:
+            self.published[topic].inc()
+            if not transport.serialises:
+                transport.publish(topic, data)
+                continue
+            # serialised once, however many transports need it
+            if payload is None:
+                payload = data.to_json().encode()
+            transport.publish(topic, payload)
+        if publishers:
+            self.publish_time.record(time.perf_counter() - start)
+        if predict:
+            self._predict(str(data.id), data.data)
+
+    def _filters(self, session: str or None) -> Filters:
+        filters = self.sessions.get(session)
+        if filters is None:
+            filters = self.filters_class(
+                cfg.SAMPLE_PERIOD,
+                cfg.BETA,
+                self.variable_dt,
+                self.initial_orientation,
+                self.snapshots.pop(session) if self.snapshots else None,
+            )
+            self.sessions[session] = filters
+        return filters
+
+    def _allows(self, topic: str, session: str, yaws: list[float], now: float):
+        policy = self.policies.get(topic)
+        return policy is None or policy.allows(session, yaws, now)
+
+    def report_publishing(self):
+        for topic, policy in self.policies.items():
+            summary = policy.summary()
+            print(
+                f"[publish] {topic}: considered={summary['considered']} "
+                f"published={summary['published']} "
+                f"heartbeats={summary['heartbeats']} "
+                f"reduction={summary['reduction']:.1%}"
+            )
+
+    def _features(self, session: str, filters: Filters, timestamp: float):
+        stage = self.features.get(session)
+        if stage is None:
+            stage = FeatureStage(self.window, self.feature_interval)
+            self.features[session] = stage
+        if not stage.add(get_angles(filters.quaternions()), timestamp):
+            return
+        id = uuid.uuid4()
+        bad_seconds = None
+        if self.classifier:
+            result = self._predict(str(id), stage.mean_yaws())
+            stage.decide(timestamp, result is Prediction.BAD)
+            bad_seconds = stage.bad_seconds
+        data = stage.data(session, bad_seconds, id)
+        payload = None
+        for transport in (self.model_publisher, self.logger_publisher):
+            if transport is None:
+                continue
+            self.published[cfg.FEATURES_TOPIC].inc()
+            if not transport.serialises:
+                transport.publish(cfg.FEATURES_TOPIC, data)
+                continue
+            if payload is None:
+                payload = data.to_json().encode()
+            transport.publish(cfg.FEATURES_TOPIC, payload)
+
+    def _predict(self, id: str, yaws: list[float]) -> Prediction or None:
+        result = self.classifier.predict(yaws)
+        if result is None:
+            return None
+        prediction = PredictingData(id, *result, Mock.REAL, "local")
+        if self.logger_publisher.serialises:
+            prediction = prediction.to_json().encode()
+        self.logger_publisher.publish(cfg.PREDICT_TOPIC, prediction)
+        self.published[cfg.PREDICT_TOPIC].inc()
+        return result[0]
+
+
+def _coalesce_key(payload: bytes or GatewayData):
+    """
+    Session and tags of a frame, frames with the same key supersede each other.
+    This runs on the paho network thread, so binary frames are keyed from their
+    header and tag bytes only. JSON frames would have to be parsed, they get
+    None and are queued as they come.
+    """
+    if isinstance(payload, GatewayData):
+        return payload.session, tuple(tag.address for tag in payload.sensor_tags)
+    if wire.is_binary(payload):
+        return wire.decode_tags(payload)
+    return None
+
+
+class FrameQueue:
+    """
+    Bounded queue of raw gateway payloads between the paho network thread and
+    the computing thread. When full, "block" waits for room and "drop-oldest"
+    discards the oldest frame. "coalesce" keeps at most one queued frame per
+    session and tags, a newer frame replacing the queued one, and otherwise
+    drops the oldest frame when full. Only binary and in-process frames are
+    coalesced, JSON frames are treated as with "drop-oldest".
+    """
+
+    POLICIES = ["block", "drop-oldest", "coalesce"]
+
+    def __init__(self, maxsize: int = 1000, policy: str = "block"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.items = OrderedDict()
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, payload: bytes, received: float):
+        key = None
+        if self.policy == "coalesce":
+            key = _coalesce_key(payload)
+        if key is None:
+            key = next(self.sequence)
+        with self.condition:
+            if key in self.items:
+                self.items[key] = (payload, received)
+                self.coalesced += 1
+                return
+            if self.policy == "block":
+                while len(self.items) >= self.maxsize:
+                    self.condition.wait()
+            elif len(self.items) >= self.maxsize:
+                self.items.popitem(last=False)
+                self.dropped += 1
+            self.items[key] = (payload, received)
+            self.max_depth = max(self.max_depth, len(self.items))
+            self.condition.notify_all()
+
+    def get(self) -> tuple[bytes, float]:
+        with self.condition:
+            while not self.items:
+                self.condition.wait()
+            item = self.items.popitem(last=False)[1]
+            self.condition.notify_all()
+            return item
+
+
+class PipelinedComputer(Computer):
+    """
+    Keeps the paho network thread to enqueueing payloads. A separate thread
+    decodes frames and runs the filters, and the publishers run their own
+    network loops.
+    """
+
+    def __init__(
+        self,
+        options: ComputerOptions = None,
+        maxsize: int = 1000,
+        policy: str = "block",
+    ):
+        super().__init__(options)
+        self.queue = FrameQueue(maxsize, policy)
+        REGISTRY.gauge("computer_queue_depth", lambda: len(self.queue))
+        REGISTRY.gauge("computer_queue_dropped", lambda: self.queue.dropped)
+        REGISTRY.gauge("computer_queue_coalesced", lambda: self.queue.coalesced)
+        # Held by the worker while it handles a frame, so close never saves
+        # the sessions halfway through one
+        self.lock = threading.Lock()
+        self.closed = False
+        if self.model_publisher:
+            self.model_publisher.loop_start()
+        self.logger_publisher.loop_start()
+        self.failed = REGISTRY.counter("computer_failed_frames_total")
+        self.worker = threading.Thread(target=self._work, daemon=True)
+        self.worker.start()
+
+    def on_frame(self, message: bytes or GatewayData):
+        self.queue.put(message, time.time())
+
+    def _work(self):
+        reported_at = time.time()
+        while True:
+            item = self.queue.get()
+            with self.lock:
+                if self.closed:
+                    return
+                try:
+                    self.handle(*item)
+                except Exception as error:
+                    # A bad frame must not stop the worker, the queue would
+                    # then fill and block the network thread for good
+                    self.failed.inc()
+                    print(f"[queue] dropped a frame that failed: {error!r}")
+            if self.stats_interval and time.time() - reported_at >= self.stats_interval:
+                reported_at = time.time()
+                print(
+                    f"[queue] depth={len(self.queue)} max={self.queue.max_depth} "
+                    f"dropped={self.queue.dropped} coalesced={self.queue.coalesced}"
                 )
-            sensor_tag = self.sensor_tag_dict.get(data.address)
-            sensor_tag.update(*data.gyroscope, *data.accelerometer, *data.magnetometer)
 
-        # dicts in python preserve insertion order
-        quaternions = [
-            ahrs.quaternion for address, ahrs in self.sensor_tag_dict.items()
+    def close(self):
+        """Stops the worker after the frame it is handling, then saves"""
+        with self.lock:
+            self.closed = True
+            super().close()
+
+
+def _shard_worker(queue: multiprocessing.Queue, options: ComputerOptions):
+    computer = Computer(options, connect=False)
+    computer.connect_publishers()
+    try:
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+            try:
+                computer.handle(*item)
+            except Exception as error:
+                print(f"[shard] dropped a frame that failed: {error!r}")
+    except KeyboardInterrupt:
+        # Ctrl-C reaches the whole process group, the workers usually get it
+        # waiting for a frame, before the parent sends them None
+        pass
+    computer.close()
+
+
+class ShardedComputer:
+    """
+    Receives gateway frames on the paho network thread and hands each one to
+    a worker process picked by a stable hash of its session id. Every session
+    is handled by one worker, so its frames stay in order. Each worker queues
+    at most queue_size frames, newer ones are dropped while it is full, and
+    a worker that died stops the computer rather than piling up frames.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        options: ComputerOptions = None,
+        queue_size: int = 1000,
+    ):
+        """With a state file, each worker keeps its sessions in its own numbered file"""
+        options = options or ComputerOptions()
+        state = options.state
+        self.queues = [multiprocessing.Queue(queue_size) for _ in range(workers)]
+        self.workers = []
+        for i, frames in enumerate(self.queues):
+            if state:
+                name = f"{state.stem}-{i}{state.suffix}"
+                options = replace(options, state=state.with_name(name))
+            self.workers.append(
+                multiprocessing.Process(
+                    target=_shard_worker, args=(frames, options), daemon=True
+                )
+            )
+        for worker in self.workers:
+            worker.start()
+
+        # The workers' own metrics stay in their processes
+        self.dispatched = [
+            REGISTRY.counter("computer_shard_frames_total", shard=i)
+            for i in range(workers)
+        ]
+        self.dropped = [
+            REGISTRY.counter("computer_shard_dropped_total", shard=i)
+            for i in range(workers)
         ]
-        yaws = [get_yaw(*q) for q in quaternions]
+        self.gateway_subscriber = MqttTransport(cfg.GATEWAY_HOST)
+        self.gateway_subscriber.subscribe(cfg.GATEWAY_TOPIC, self.on_frame)
 
-        # TODO: Why skip first yaw?
-        if yaws[0] == 0.0:
+    def on_frame(self, payload: bytes):
+        received = time.time()
+        shard = shard_of(_session_of(payload), len(self.queues))
+        if not self.workers[shard].is_alive():
+            # Raised out of the network loop, which stops the computer
+            raise RuntimeError(
+                f"Shard {shard} exited with code {self.workers[shard].exitcode}"
+            )
+        try:
+            self.queues[shard].put_nowait((payload, received))
+        except queue.Full:
+            self.dropped[shard].inc()
             return
+        self.dispatched[shard].inc()
 
-        payload = ClassifyingData(yaws).to_json().encode()
-        self.model_publisher.publish(cfg.CLASSIFY_TOPIC, payload)
-        self.logger_publisher.publish(cfg.LOGGER_TOPIC, payload)
+    def close(self):
+        for worker, frames in zip(self.workers, self.queues):
+            # A dead worker would never make room for the None
+            if worker.is_alive():
+                frames.put(None)
+        for worker in self.workers:
+            worker.join()
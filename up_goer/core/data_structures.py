@@ -1,6 +1,7 @@
 import uuid
 from dataclasses import astuple, dataclass
 from enum import Enum
+from typing import Optional
 
 from dataclasses_json import dataclass_json
 
@@ -40,6 +41,14 @@ class SensorTagData:
 @dataclass(frozen=True)
 class GatewayData:
     sensor_tags: list[SensorTagData]
+    """Time the gateway published the frame, for latency tracing"""
+    published: Optional[float] = None
+    """Identifies the vest the frame came from when one computer serves many"""
+    session: Optional[str] = None
+    """Every tag of the gateway in order, so the computer can fix the yaw order"""
+    tags: Optional[list[str]] = None
+    """Tags that are disconnected or have not produced valid data yet"""
+    missing: Optional[list[str]] = None
 
 
 class Prediction(Enum):
@@ -55,12 +64,28 @@ class Mock(Enum):
 @dataclass_json
 @dataclass(init=False)
 class ClassifyingData:
-    data: list[float]
-    id: uuid.UUID
+    """data holds the yaw of every tag, None for tags that are missing"""
 
-    def __init__(self, data):
+    data: list[Optional[float]]
+    id: uuid.UUID
+    """
+    Latency trace, the times the newest sample was received by the gateway,
+    the gateway published it, and the computer received and published it
+    """
+    trace: Optional[list[float]]
+    session: Optional[str]
+
+    def __init__(
+        self,
+        data,
+        id: uuid.UUID = None,
+        trace: list[float] = None,
+        session: str = None,
+    ):
         self.data = data
-        self.id = uuid.uuid4()
+        self.id = id or uuid.uuid4()
+        self.trace = trace
+        self.session = session
 
 
 @dataclass_json
@@ -71,3 +96,43 @@ class PredictingData:
     """Confidence level, if available"""
     score: float or None
     mock: Mock
+    """Where the prediction was made, "local" for the computer, None for the server"""
+    source: Optional[str] = None
+
+
+@dataclass_json
+@dataclass(init=False)
+class FeatureData:
+    """
+    Window statistics of every tag, for each tag the mean, variance, min and
+    max of its roll, pitch and yaw in that order, then the mean yaw of every
+    other tag relative to the first
+    """
+
+    data: list[float]
+    id: uuid.UUID
+    tags: int
+    """Frames in the window and the seconds they span"""
+    samples: int
+    seconds: float
+    """Seconds of the window classified as bad posture, with a local classifier"""
+    bad_seconds: Optional[float]
+    session: Optional[str]
+
+    def __init__(
+        self,
+        data,
+        tags: int,
+        samples: int,
+        seconds: float,
+        bad_seconds: float = None,
+        id: uuid.UUID = None,
+        session: str = None,
+    ):
+        self.data = data
+        self.id = id or uuid.uuid4()
+        self.tags = tags
+        self.samples = samples
+        self.seconds = seconds
+        self.bad_seconds = bad_seconds
+        self.session = session
@@ -0,0 +1,196 @@
+"""
+Compact binary encoding of GatewayData
+--------------------------------------
+
+A frame is a fixed header followed by one fixed-width record per sensor tag sample.
+
+Header (little endian, 14 bytes):
+ - magic: b"UG", lets consumers tell a binary frame from a JSON one
+ - version: uint8
+ - flags: uint8, bit 0 set when the frame carries the publish time, bit 1 a
+   session id, bit 2 the number of gateway tags, bit 3 missing tags and bit 4
+   the gateway's tag addresses
+ - count: uint16, number of records
+ - timestamp: float64, base timestamp of the frame
+
+Publish time (little endian, 8 bytes, only when flag bit 0 is set):
+ - published: float64, time the gateway published the frame
+
+Session id (only when flag bit 1 is set):
+ - length: uint8
+ - session: length bytes of utf-8
+
+Tags (only when flag bit 2 is set):
+ - count: uint8, the gateway's tags are indices 0 to count - 1
+
+Addresses (only when flag bit 4 is set, instead of bit 2):
+ - count: uint8
+ - count x (length: uint8, address: length bytes of utf-8), in tag index order
+
+Missing tags (only when flag bit 3 is set):
+ - count: uint8
+ - tags: count x uint8 tag indices
+
+Record (little endian, 41 bytes):
+ - tag: uint8, index of the tag in the gateway's address list
+ - offset: float32, seconds between the base timestamp and the sample
+ - axes: 9 x float32, gyroscope, accelerometer and magnetometer x, y, z
+"""
+
+import struct
+from typing import NamedTuple
+
+import numpy as np
+from up_goer.core.data_structures import GatewayData
+
+MAGIC = b"UG"
+VERSION = 1
+
+FLAG_PUBLISHED = 1
+FLAG_SESSION = 2
+FLAG_TAGS = 4
+FLAG_MISSING = 8
+FLAG_ADDRESSES = 16
+
+HEADER = struct.Struct("<2sBBHd")
+PUBLISHED = struct.Struct("<d")
+SESSION_LENGTH = struct.Struct("<B")
+COUNT = struct.Struct("<B")
+RECORD = struct.Struct("<Bf9f")
+RECORD_DTYPE = np.dtype([("tag", "<u1"), ("offset", "<f4"), ("axes", "<f4", (9,))])
+
+
+class Frame(NamedTuple):
+    timestamp: float
+    published: float or None
+    session: str or None
+    # Addresses of the gateway's tags, or their indices if it sent only a count
+    tags: list[str] or list[int] or None
+    missing: list[int] or None
+    records: np.ndarray
+
+
+def is_binary(payload: bytes) -> bool:
+    return payload[:2] == MAGIC
+
+
+def encode(data: GatewayData, tag_index: dict[str, int]) -> bytes:
+    sensor_tags = data.sensor_tags
+    timestamp = min(tag.timestamp for tag in sensor_tags)
+    flags = 0
+    extra = b""
+    if data.published is not None:
+        flags |= FLAG_PUBLISHED
+        extra += PUBLISHED.pack(data.published)
+    if data.session is not None:
+        session = data.session.encode()
+        flags |= FLAG_SESSION
+        extra += SESSION_LENGTH.pack(len(session)) + session
+    if data.tags is not None:
+        # Addresses, so that filter states follow their tag if the order changes
+        flags |= FLAG_ADDRESSES
+        extra += COUNT.pack(len(data.tags))
+        for address in data.tags:
+            address = address.encode()
+            extra += SESSION_LENGTH.pack(len(address)) + address
+    if data.missing is not None:
+        flags |= FLAG_MISSING
+        extra += COUNT.pack(len(data.missing))
+        extra += bytes(tag_index[address] for address in data.missing)
+    offset = HEADER.size + len(extra)
+    buffer = bytearray(offset + RECORD.size * len(sensor_tags))
+    HEADER.pack_into(buffer, 0, MAGIC, VERSION, flags, len(sensor_tags), timestamp)
+    buffer[HEADER.size : offset] = extra
+    for tag in sensor_tags:
+        RECORD.pack_into(
+            buffer,
+            offset,
+            tag_index[tag.address],
+            tag.timestamp - timestamp,
+            *tag.gyroscope,
+            *tag.accelerometer,
+            *tag.magnetometer,
+        )
+        offset += RECORD.size
+    return bytes(buffer)
+
+
+def _decode_header(payload: bytes):
+    magic, version, flags, count, timestamp = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("Not a binary gateway frame")
+    if version != VERSION:
+        raise ValueError(f"Unsupported gateway frame version: {version}")
+    offset = HEADER.size
+    published = None
+    session = None
+    tags = None
+    missing = None
+    if flags & FLAG_PUBLISHED:
+        (published,) = PUBLISHED.unpack_from(payload, offset)
+        offset += PUBLISHED.size
+    if flags & FLAG_SESSION:
+        (length,) = SESSION_LENGTH.unpack_from(payload, offset)
+        offset += SESSION_LENGTH.size
+        session = bytes(payload[offset : offset + length]).decode()
+        offset += length
+    if flags & FLAG_TAGS:
+        (length,) = COUNT.unpack_from(payload, offset)
+        offset += COUNT.size
+        tags = list(range(length))
+    if flags & FLAG_ADDRESSES:
+        (length,) = COUNT.unpack_from(payload, offset)
+        offset += COUNT.size
+        tags = []
+        for _ in range(length):
+            (size,) = SESSION_LENGTH.unpack_from(payload, offset)
+            offset += SESSION_LENGTH.size
+            tags.append(bytes(payload[offset : offset + size]).decode())
+            offset += size
+    if flags & FLAG_MISSING:
+        (length,) = COUNT.unpack_from(payload, offset)
+        offset += COUNT.size
+        missing = list(payload[offset : offset + length])
+        offset += length
+    return timestamp, published, session, tags, missing, count, offset
+
+
+def decode_session(payload: bytes) -> str or None:
+    """Reads only the session id, without touching the records"""
+    return _decode_header(payload)[2]
+
+
+def decode_tags(payload: bytes) -> tuple[str or None, bytes]:
+    """
+    Reads only the session id and the tag byte of every record, for keying a
+    frame without decoding its samples
+    """
+    _, _, session, _, _, count, offset = _decode_header(payload)
+    end = offset + RECORD.size * count
+    return session, bytes(payload[offset : end : RECORD.size])
+
+
+def tag_keys(frame: Frame) -> tuple[list, list or None]:
+    """
+    Tags of the records and the missing tags, as addresses when the frame has
+    the gateway's and as indices otherwise
+    """
+    indices = frame.records["tag"].tolist()
+    if frame.tags is None:
+        return indices, frame.missing
+    keys = [frame.tags[i] for i in indices]
+    if frame.missing is None:
+        return keys, None
+    return keys, [frame.tags[i] for i in frame.missing]
+
+
+def decode(payload: bytes) -> Frame:
+    """
+    Decodes a frame, the records are a structured array viewing the payload
+    buffer directly, without copying.
+    """
+    timestamp, published, session, tags, missing, count, offset = _decode_header(
+        payload
+    )
+    records = np.frombuffer(payload, dtype=RECORD_DTYPE, count=count, offset=offset)
+    return Frame(timestamp, published, session, tags, missing, records)
@@ -0,0 +1,186 @@
+import uuid
+from collections import deque
+
+import numpy as np
+from up_goer.ahrs.ahrs import wrap_degrees
+from up_goer.core.data_structures import FeatureData
+
+
+def _push(extremes: deque, sequence: int, value: float, oldest: int, lower: bool):
+    """
+    Adds a value to a monotonic deque of (sequence, value), whose first item is
+    the min (lower) or max of the values since oldest. Each value is appended
+    and popped once, so this is O(1) amortised.
+    """
+    while extremes and (
+        extremes[-1][1] >= value if lower else extremes[-1][1] <= value
+    ):
+        extremes.pop()
+    extremes.append((sequence, value))
+    while extremes[0][0] < oldest:
+        extremes.popleft()
+
+
+class SlidingWindow:
+    """
+    Ring buffer of the last size rows of angles in degrees, keeping the mean,
+    variance, min and max of each column up to date as rows are added. Angles
+    are unwrapped against the previous row first, so a tag turning past 180
+    degrees does not look like a jump across the whole circle.
+    """
+
+    def __init__(self, size: int, columns: int):
+        self.size = size
+        self.rows = np.zeros((size, columns))
+        self.times = np.zeros(size)
+        self.count = 0
+        self.added = 0
+        self.mean = np.zeros(columns)
+        # Sum of squared differences from the mean, as in Welford's algorithm
+        self.m2 = np.zeros(columns)
+        self.last: np.ndarray = None
+        self.unwrapped: np.ndarray = None
+        self.minima = [deque() for _ in range(columns)]
+        self.maxima = [deque() for _ in range(columns)]
+
+    def __len__(self):
+        return self.count
+
+    def add(self, angles, timestamp: float):
+        angles = np.asarray(angles, dtype=np.float64)
+        if self.last is None:
+            self.unwrapped = angles.copy()
+        else:
+            self.unwrapped = self.unwrapped + wrap_degrees(angles - self.last)
+        self.last = angles
+        value = self.unwrapped
+
+        position = self.added % self.size
+        if self.count < self.size:
+            self.count += 1
+            delta = value - self.mean
+            self.mean = self.mean + delta / self.count
+            self.m2 = self.m2 + delta * (value - self.mean)
+        else:
+            # The new row replaces the oldest, Welford's update for both at once
+            old = self.rows[position]
+            mean = self.mean + (value - old) / self.size
+            self.m2 = self.m2 + (value - old) * (value - mean + old - self.mean)
+            self.mean = mean
+        self.rows[position] = value
+        self.times[position] = timestamp
+
+        oldest = self.added - self.size + 1
+        for column, item in enumerate(value.tolist()):
+            _push(self.minima[column], self.added, item, oldest, lower=True)
+            _push(self.maxima[column], self.added, item, oldest, lower=False)
+        self.added += 1
+
+    @property
+    def variance(self) -> np.ndarray:
+        # Rounding can leave a constant column slightly below zero
+        return np.maximum(self.m2 / max(self.count, 1), 0.0)
+
+    @property
+    def minimum(self) -> np.ndarray:
+        return np.array([extremes[0][1] for extremes in self.minima])
+
+    @property
+    def maximum(self) -> np.ndarray:
+        return np.array([extremes[0][1] for extremes in self.maxima])
+
+    @property
+    def seconds(self) -> float:
+        """Time between the oldest and the newest row"""
+        if self.count == 0:
+            return 0.0
+        newest = self.times[(self.added - 1) % self.size]
+        oldest = self.times[(self.added - self.count) % self.size]
+        return float(newest - oldest)
+
+    @property
+    def oldest(self) -> float:
+        return float(self.times[(self.added - self.count) % self.size])
+
+
+class FeatureStage:
+    """
+    Window statistics of the orientations of a session's tags, published as a
+    FeatureData every interval seconds instead of deriving them from every
+    frame downstream. With a local classifier the decisions made on each
+    feature vector are kept too, to tell how long the window was spent in bad
+    posture.
+    """
+
+    def __init__(self, size: int, interval: float):
+        self.size = size
+        self.interval = interval
+        self.window: SlidingWindow = None
+        self.published_at: float = None
+        # (time, seconds judged bad) of each decision, newest last
+        self.decisions = deque[tuple[float, float]]()
+        self.bad_seconds = 0.0
+        self.decided_at: float = None
+
+    def add(self, angles: np.ndarray, timestamp: float) -> bool:
+        """
+        Adds the (tags, 3) roll, pitch and yaw of every tag, and tells whether
+        the features are due. A new tag starts a new window.
+        """
+        tags = len(angles)
+        if self.window is None or self.window.rows.shape[1] != 3 * tags:
+            self.window = SlidingWindow(self.size, 3 * tags)
+        self.window.add(np.ravel(angles), timestamp)
+        if self.published_at is None:
+            self.published_at = timestamp
+        if timestamp - self.published_at < self.interval:
+            return False
+        self.published_at = timestamp
+        return True
+
+    @property
+    def tags(self) -> int:
+        return self.window.rows.shape[1] // 3
+
+    def mean_yaws(self) -> list[float]:
+        """Mean yaw of every tag over the window, for the classifier"""
+        return wrap_degrees(self.window.mean[2::3]).tolist()
+
+    def decide(self, timestamp: float, bad: bool):
+        """Counts the time since the last decision as bad posture or not"""
+        seconds = 0.0
+        if bad and self.decided_at is not None:
+            seconds = timestamp - self.decided_at
+        self.decided_at = timestamp
+        self.decisions.append((timestamp, seconds))
+        self.bad_seconds += seconds
+        while self.decisions and self.decisions[0][0] < self.window.oldest:
+            self.bad_seconds -= self.decisions.popleft()[1]
+
+    def features(self) -> list[float]:
+        window = self.window
+        mean = wrap_degrees(window.mean)
+        # min and max moved by the same whole turns as the mean
+        shift = mean - window.mean
+        columns = np.stack(
+            [mean, window.variance, window.minimum + shift, window.maximum + shift],
+            axis=1,
+        )
+        relative = wrap_degrees(mean[5::3] - mean[2])
+        return np.round(np.concatenate([columns.ravel(), relative]), 2).tolist()
+
+    def data(
+        self, session: str = None, bad_seconds: float = None, id: uuid.UUID = None
+    ) -> FeatureData:
+        if bad_seconds is not None:
+            # The oldest decision may reach back past the window
+            bad_seconds = round(min(max(bad_seconds, 0.0), self.window.seconds), 3)
+        return FeatureData(
+            self.features(),
+            self.tags,
+            len(self.window),
+            round(self.window.seconds, 3),
+            bad_seconds,
+            id,
+            session,
+        )
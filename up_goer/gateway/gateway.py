@@ -1,39 +1,132 @@
 import asyncio
+import time
 
-import arrow
 import click
 from bleak import BleakClient
-from paho.mqtt.client import Client
 from up_goer.cc2650.cc2650 import (
     AccelerometerSensorMovementSensorMPU9250,
     GyroscopeSensorMovementSensorMPU9250,
     MagnetometerSensorMovementSensorMPU9250,
     MovementSensorMPU9250,
+    movement_period,
 )
 from up_goer.cfg import cfg
+from up_goer.core import wire
 from up_goer.core.data_structures import GatewayData, SensorData, SensorTagData
+from up_goer.metrics.metrics import REGISTRY
+from up_goer.transport.transport import MqttTransport, Transport
+
+
+class Link:
+    """Connection state and history of one tag, kept by Gateway.supervise"""
+
+    def __init__(self):
+        self.connected = False
+        self.reconnects = 0
+        self.downtime = 0.0
+        self.changed_at = time.time()
+
+    def up(self):
+        now = time.time()
+        self.downtime += now - self.changed_at
+        self.changed_at = now
+        self.connected = True
+
+    def down(self):
+        self.changed_at = time.time()
+        self.connected = False
+        self.reconnects += 1
+
+    def stats(self) -> dict:
+        downtime = self.downtime
+        if not self.connected:
+            downtime += time.time() - self.changed_at
+        return {
+            "connected": self.connected,
+            "reconnects": self.reconnects,
+            "downtime": downtime,
+        }
 
 
 class Gateway:
-    def __init__(self, sensor_tags: list):
+    def __init__(
+        self,
+        sensor_tags: list,
+        binary: bool = False,
+        periods: dict[str, int] = None,
+        batch_size: int = 1,
+        batch_latency: float = 0.0,
+        session: str = None,
+        backoff_min: float = 1.0,
+        backoff_max: float = 30.0,
+        transport: Transport = None,
+        client_class=BleakClient,
+    ):
+        """client_class makes the BLE clients, a SimulatedClient works without tags"""
         print(f"Initializing gateway with tags: {sensor_tags}")
-        # TODO: hacky way to pass data from while true loop
+        self.binary = binary
+        self.session = session
+        # Reconnect delays double from backoff_min up to backoff_max, and reset
+        # once a connection has stayed up for backoff_max
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.links = {address: Link() for address in sensor_tags}
+        # A batch is published once it holds batch_size samples or its oldest
+        # sample is batch_latency seconds old, whichever comes first
+        self.batch_size = batch_size
+        self.batch_latency = batch_latency
+        self.tag_index = {address: i for i, address in enumerate(sensor_tags)}
+        # Latest sample per tag, None while the tag has no valid data
         self.sensor_tags = dict[str, SensorTagData or None]()
+        self.periods = dict[str, int]()
         for address in sensor_tags:
             self.sensor_tags[address] = None
+            # Checked here, connect would retry a bad period forever
+            period = (periods or {}).get(address, cfg.MOVEMENT_PERIOD_MS)
+            self.periods[address] = movement_period(period)
+        # Created in main so that it belongs to the running event loop
+        self.queue: asyncio.Queue = None
 
-        self.computer_publisher = Client()
-        self.computer_publisher.connect(cfg.COMPUTER_HOST)
+        self.client_class = client_class
+        self.samples_published = 0
+        self.messages = REGISTRY.counter("gateway_messages_total")
+        self.publish_time = REGISTRY.histogram("gateway_publish_seconds")
+        REGISTRY.gauge(
+            "gateway_queue_depth", lambda: self.queue.qsize() if self.queue else 0
+        )
+        self.computer_publisher = transport or MqttTransport(cfg.COMPUTER_HOST)
 
     async def main(self):
+        self.queue = asyncio.Queue()
         await asyncio.gather(
-            *[self.connect(address) for address in self.sensor_tags.keys()],
+            *[self.supervise(address) for address in self.sensor_tags.keys()],
             self.output_data(),
         )
 
+    async def supervise(self, address: str):
+        """Keeps one tag connected, without affecting the other tags"""
+        link = self.links[address]
+        delay = self.backoff_min
+        while True:
+            try:
+                await self.connect(address)
+            except Exception as error:
+                click.echo(f"Sensor {address} failed: {error!r}")
+            if link.connected:
+                if time.time() - link.changed_at >= self.backoff_max:
+                    delay = self.backoff_min
+                link.down()
+            self.sensor_tags[address] = None
+            click.echo(f"Sensor {address} reconnecting in {delay:.0f}s, {link.stats()}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.backoff_max)
+
+    def link_stats(self) -> dict[str, dict]:
+        return {address: link.stats() for address, link in self.links.items()}
+
     async def connect(self, address: str):
         print(f"Connecting sensor: {address}")
-        async with BleakClient(address) as client:
+        async with self.client_class(address) as client:
             x = await client.is_connected()
             click.echo(f"Sensor {address} Connected: {x}")
 
@@ -41,38 +134,80 @@ class Gateway:
             gyro_sensor = GyroscopeSensorMovementSensorMPU9250()
             magneto_sensor = MagnetometerSensorMovementSensorMPU9250()
 
-            movement_sensor = MovementSensorMPU9250()
+            movement_sensor = MovementSensorMPU9250(self.periods[address])
             movement_sensor.register(acc_sensor)
             movement_sensor.register(gyro_sensor)
             movement_sensor.register(magneto_sensor)
-            await movement_sensor.start_listener(client)
 
             init = False
-            while True:
-                await asyncio.sleep(0.1)
-                if not await client.is_connected():
-                    raise ConnectionError()
-                timestamp = arrow.now("+08:00").timestamp()
-                gyro_data = SensorData(*gyro_sensor.data)
-                acc_data = SensorData(*acc_sensor.data)
-                magneto_data = SensorData(*magneto_sensor.data)
+            notifications = REGISTRY.counter("gateway_notifications_total", tag=address)
+
+            def on_notify(timestamp: float):
+                nonlocal init
+                notifications.inc()
                 data = SensorTagData(
-                    client.address, timestamp, gyro_data, acc_data, magneto_data
+                    address,
+                    timestamp,
+                    SensorData(*gyro_sensor.data),
+                    SensorData(*acc_sensor.data),
+                    SensorData(*magneto_sensor.data),
                 )
 
                 # Check for initial invalid data
                 if not init:
                     if not data.is_valid():
-                        continue
+                        return
                     init = True
 
-                self.sensor_tags[client.address] = data
+                self.queue.put_nowait(data)
+
+            movement_sensor.on_notify(on_notify)
+            await movement_sensor.start_listener(client)
+            self.links[address].up()
+
+            while True:
+                await asyncio.sleep(1)
+                if not await client.is_connected():
+                    raise ConnectionError()
 
     async def output_data(self):
+        batch = list[SensorTagData]()
+        deadline = None
         while True:
-            await asyncio.sleep(0.1)
-            if None in self.sensor_tags.values():
+            timeout = None if deadline is None else max(deadline - time.time(), 0)
+            try:
+                data = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                self.publish(batch)
+                batch = []
+                deadline = None
+                continue
+
+            if not self.links[data.address].connected:
+                # Sample queued by a connection that has since dropped
                 continue
-            payload = GatewayData(list(self.sensor_tags.values()))
+            self.sensor_tags[data.address] = data
+            batch.append(data)
+
+            if deadline is None:
+                deadline = time.time() + self.batch_latency
+            if len(batch) >= self.batch_size or time.time() >= deadline:
+                self.publish(batch)
+                batch = []
+                deadline = None
+
+    def publish(self, samples: list[SensorTagData]):
+        start = time.perf_counter()
+        missing = [address for address, data in self.sensor_tags.items() if not data]
+        # Every frame carries the tag order, a computer may start at any frame
+        tags = list(self.sensor_tags.keys())
+        self.samples_published += len(samples)
+        payload = GatewayData(samples, time.time(), self.session, tags, missing or None)
+        # in-process transports take the data as it is
+        if self.computer_publisher.serialises and self.binary:
+            payload = wire.encode(payload, self.tag_index)
+        elif self.computer_publisher.serialises:
             payload = payload.to_json().encode()
-            self.computer_publisher.publish(cfg.GATEWAY_TOPIC, payload=payload)
+        self.computer_publisher.publish(cfg.GATEWAY_TOPIC, payload)
+        self.messages.inc()
+        self.publish_time.record(time.perf_counter() - start)
@@ -0,0 +1,190 @@
+"""
+Sidecar index of a CSV log, <log>.idx, with a "timestamp,offset" line for
+the first row written after each interval seconds. Rows are written in time
+order, so a time range starts at or after the last indexed row before it and
+reading it never touches the rest of the file.
+"""
+
+import bisect
+import gzip
+import itertools
+import math
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+def index_path(path: Path) -> Path:
+    return Path(f"{path}.idx")
+
+
+class IndexWriter:
+    """Appends to the index of a CSV log as its rows are written"""
+
+    def __init__(self, path: Path, interval: float = 1.0):
+        self.path = index_path(path)
+        self.interval = interval
+        self.file = open(self.path, mode="a")
+        self.indexed_at = -math.inf
+
+    def add(self, timestamp: float, offset: int) -> bool:
+        """Records the row at byte offset if interval has passed since the last"""
+        if timestamp - self.indexed_at < self.interval:
+            return False
+        self.indexed_at = timestamp
+        self.file.write(f"{timestamp},{offset}\n")
+        return True
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_index(path: Path) -> tuple[list[float], list[int]]:
+    """Timestamps and offsets from the index of path, empty if it has none"""
+    timestamps, offsets = [], []
+    try:
+        with open(index_path(path)) as file:
+            for line in file:
+                timestamp, _, offset = line.partition(",")
+                # A line cut short by a crash is dropped
+                if offset.endswith("\n"):
+                    timestamps.append(float(timestamp))
+                    offsets.append(int(offset))
+    except FileNotFoundError:
+        pass
+    return timestamps, offsets
+
+
+def build_index(path: Path, interval: float = 1.0) -> int:
+    """Indexes an existing CSV log from scratch, returns the entries written"""
+    index_path(path).unlink(missing_ok=True)
+    index = IndexWriter(path, interval)
+    entries = 0
+    offset = 0
+    with open(path, "rb") as file:
+        for line in file:
+            entries += index.add(float(line[: line.index(b",")]), offset)
+            offset += len(line)
+    index.close()
+    return entries
+
+
+def _bucket(line: bytes, every: float) -> int:
+    return math.floor(float(line[: line.index(b",")]) / every)
+
+
+def query_file(path: Path, start: float = None, end: float = None, every=None):
+    """
+    Yields the rows of path from start up to and including end, as bytes. With
+    every, only the first row in each every seconds is kept, counted from the
+    epoch so rows kept from different files line up. Gzipped logs have no
+    index and are read from their first row.
+    """
+    offset = 0
+    if path.suffix == ".gz":
+        file = gzip.open(path, "rb")
+    else:
+        file = open(path, "rb")
+        timestamps, offsets = read_index(path)
+        if start is not None:
+            # Strictly before start, rows at start may share its timestamp
+            position = bisect.bisect_left(timestamps, start)
+            if position:
+                offset = offsets[position - 1]
+    bucket = None
+    with file:
+        file.seek(offset)
+        for line in file:
+            timestamp = float(line[: line.index(b",")])
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp > end:
+                return
+            if every:
+                row_bucket = math.floor(timestamp / every)
+                if row_bucket == bucket:
+                    continue
+                bucket = row_bucket
+            yield line
+
+
+def _query_file(
+    path: Path, start: float, end: float, every: float, directory: str
+) -> str:
+    """Writes the rows of path to a temporary file in directory, returns its name"""
+    with tempfile.NamedTemporaryFile("wb", dir=directory, delete=False) as file:
+        file.writelines(query_file(path, start, end, every))
+    return file.name
+
+
+def _query_parallel(paths: list[Path], start, end, every, workers: int):
+    """
+    Yields the rows of each path as an open file, in order. The workers write
+    them to temporary files instead of sending them back whole, and only two
+    files per worker are read ahead of the one being yielded.
+    """
+    with tempfile.TemporaryDirectory() as directory, ProcessPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        remaining = iter(paths)
+        queued = deque()
+
+        def submit(count: int):
+            for path in itertools.islice(remaining, count):
+                queued.append(
+                    executor.submit(_query_file, path, start, end, every, directory)
+                )
+
+        submit(2 * workers)
+        while queued:
+            name = queued.popleft().result()
+            submit(1)
+            with open(name, "rb") as file:
+                yield file
+            Path(name).unlink()
+
+
+def _write(results, output, every: float or None) -> int:
+    rows = 0
+    last = None
+    for lines in results:
+        first = True
+        for line in lines:
+            # A file can start in the bucket the one before it ended in
+            if (
+                first
+                and every
+                and last
+                and _bucket(line, every) == _bucket(last, every)
+            ):
+                first = False
+                continue
+            first = False
+            output.write(line)
+            last = line
+            rows += 1
+    return rows
+
+
+def query_files(
+    paths: list[Path],
+    output,
+    start: float = None,
+    end: float = None,
+    every: float = None,
+    workers: int = 1,
+) -> int:
+    """
+    Writes the rows of every path in the range to the binary file output, in
+    the order of paths, and returns how many. Single files are streamed, with
+    workers the files are read in that many processes at once.
+    """
+    if workers > 1 and len(paths) > 1:
+        results = _query_parallel(paths, start, end, every, workers)
+        return _write(results, output, every)
+    results = (query_file(path, start, end, every) for path in paths)
+    return _write(results, output, every)
@@ -1,49 +1,235 @@
-import os
+import gzip
+import math
+import shutil
+import threading
+import time
 from pathlib import Path
 
-import arrow
-from paho.mqtt.client import Client
 from up_goer.cfg import cfg
-from up_goer.core.data_structures import ClassifyingData
+from up_goer.core import wire
+from up_goer.core.data_structures import ClassifyingData, GatewayData
+from up_goer.index.index import IndexWriter, index_path
+from up_goer.metrics.metrics import REGISTRY
+from up_goer.transport.transport import MqttTransport, Transport
 
 
-def _write_csv(data: str, path: Path):
-    mode = "a" if os.path.exists(path.parent) else "w"
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, mode=mode) as file:
-        file.write(data)
+def format_csv(time: float, data: list[float]) -> str:
+    # Missing yaws are left empty
+    stringified_data = list(map(lambda x: "" if x is None else str(x), data))
+    stringified_data.insert(0, str(time))
+    return ",".join(stringified_data) + "\n"
 
 
-def _save_csv(data: list[float], path: Path):
-    time = arrow.now().timestamp()
-    stringified_data = list(map(lambda x: str(x), data))
-    stringified_data.insert(0, str(time))
-    output = ",".join(stringified_data)
-    _write_csv(output + "\n", path)
+def _compress(path: Path):
+    with open(path, "rb") as src, gzip.open(f"{path}.gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    path.unlink()
 
 
-class Logger:
-    def __init__(self, path: Path):
+class CsvWriter:
+    """
+    Long-lived buffered writer for CSV rows.
+
+    Rows are kept in memory until flush_size bytes are pending or flush_interval
+    seconds have passed since the last flush. The file is rotated once it holds
+    rotate_size bytes or has been open for rotate_interval seconds; rotated
+    segments are renamed to <stem>.<timestamp><suffix> and optionally gzipped in
+    a background thread. With an index_interval, rows written by write_row are
+    indexed by time in a sidecar file for query, gzipped segments lose theirs.
+    A background thread checks the time thresholds every flush_interval
+    seconds too, but at most ten times a second, so rows are not held back
+    while none are written.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        flush_size: int = 64 * 1024,
+        flush_interval: float = 1.0,
+        rotate_size: int = None,
+        rotate_interval: float = None,
+        compress: bool = False,
+        index_interval: float = None,
+    ):
         self.path = path
-        self.computer_subscriber = Client()
-        self.computer_subscriber.on_connect = self.on_connect
-        self.computer_subscriber.on_message = self.on_message
-        self.computer_subscriber.connect(cfg.COMPUTER_HOST)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.rotate_size = rotate_size
+        self.rotate_interval = rotate_interval
+        self.compress = compress
+        self.index_interval = index_interval
+        self.index: IndexWriter = None
+        self.buffer = list[str]()
+        self.pending = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._open()
+        # Taken by the writing thread and the timer alike
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.timer = threading.Thread(target=self._tick, daemon=True)
+        self.timer.start()
 
-    def on_connect(self, client: Client, userdata, flags, result_code):
-        if client is not self.computer_subscriber:
-            return
-        client.subscribe(cfg.LOGGER_TOPIC)
+    def _open(self):
+        self.file = open(self.path, mode="a")
+        self.size = self.file.tell()
+        if self.index_interval:
+            self.index = IndexWriter(self.path, self.index_interval)
+        self.opened_at = time.monotonic()
+        self.flushed_at = self.opened_at
+
+    def write(self, row: str):
+        with self.lock:
+            self.buffer.append(row)
+            self.pending += len(row)
+            self._check()
+
+    def _check(self):
+        now = time.monotonic()
+        if (
+            self.pending >= self.flush_size
+            or now - self.flushed_at >= self.flush_interval
+        ):
+            self.flush()
+            if (self.rotate_size and self.size >= self.rotate_size) or (
+                self.rotate_interval and now - self.opened_at >= self.rotate_interval
+            ):
+                self.rotate()
+
+    def _tick(self):
+        # With flush_interval 0 every write flushes, the timer only has the
+        # rotation to check and must not spin
+        while not self.stopped.wait(max(self.flush_interval, 0.1)):
+            with self.lock:
+                # An empty segment is not worth rotating
+                if self.pending or self.size:
+                    self._check()
+
+    def flush(self):
+        with self.lock:
+            self.file.writelines(self.buffer)
+            self.file.flush()
+            if self.index:
+                # after the rows, so the index never points past the end of the log
+                self.index.flush()
+            self.size += self.pending
+            self.buffer.clear()
+            self.pending = 0
+            self.flushed_at = time.monotonic()
 
-    def on_message(self, client: Client, userdata, message):
-        if client is not self.computer_subscriber:
+    def rotate(self):
+        self.file.close()
+        if self.index:
+            self.index.close()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        rotated = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        count = 0
+        while rotated.exists() or Path(f"{rotated}.gz").exists():
+            count += 1
+            rotated = self.path.with_name(
+                f"{self.path.stem}.{stamp}-{count}{self.path.suffix}"
+            )
+        self.path.rename(rotated)
+        if self.index and self.compress:
+            index_path(self.path).unlink()
+        elif self.index:
+            index_path(self.path).rename(index_path(rotated))
+        if self.compress:
+            threading.Thread(target=_compress, args=(rotated,)).start()
+        self._open()
+
+    def write_row(self, timestamp: float, data: list[float]):
+        with self.lock:
+            if self.index:
+                self.index.add(timestamp, self.size + self.pending)
+            self.write(format_csv(timestamp, data))
+
+    def close(self):
+        self.stopped.set()
+        self.timer.join()
+        self.flush()
+        self.file.close()
+        if self.index:
+            self.index.close()
+
+
+# Raw data of a tag that has not sent a sample yet
+NO_RAW = (math.nan,) * 9
+
+
+class Logger:
+    def __init__(
+        self,
+        writer,
+        status_interval: float = 1.0,
+        transport: Transport = None,
+        raw: bool = False,
+    ):
+        """
+        writer is a CsvWriter or anything else with write_row and close. Without
+        a transport the logger subscribes to the computer's broker. With raw,
+        it also subscribes to the gateway's frames and passes the writer the
+        latest sensor data of every tag with each row, which a StoreWriter
+        keeps next to the yaws.
+        """
+        self.writer = writer
+        # Seconds between status lines, 0 disables them
+        self.status_interval = status_interval
+        self.status_at = 0.0
+        self.rows = 0
+        self.rows_total = REGISTRY.counter("logger_rows_total")
+        self.write_time = REGISTRY.histogram("logger_write_seconds")
+        self.computer_subscriber = transport or MqttTransport(cfg.COMPUTER_HOST)
+        self.computer_subscriber.subscribe(cfg.LOGGER_TOPIC, self.on_message)
+        # Latest gyroscope, accelerometer and magnetometer x, y, z per session
+        # and place of the tag in the gateway's order
+        self.latest: dict[tuple[str or None, int], tuple] = None
+        self.gateway_subscriber = None
+        if raw:
+            self.latest = dict()
+            self.gateway_subscriber = MqttTransport(cfg.GATEWAY_HOST)
+            self.gateway_subscriber.subscribe(cfg.GATEWAY_TOPIC, self.on_frame)
+            self.gateway_subscriber.loop_start()
+
+    def on_message(self, message: bytes or ClassifyingData):
+        if not isinstance(message, ClassifyingData):
+            message = ClassifyingData.from_json(message.decode())
+        self._parse(message)
+
+    def on_frame(self, message: bytes or GatewayData):
+        if isinstance(message, bytes) and wire.is_binary(message):
+            frame = wire.decode(message)
+            for tag, axes in zip(frame.records["tag"].tolist(), frame.records["axes"]):
+                self.latest[frame.session, tag] = tuple(axes.tolist())
             return
-        if message.topic != cfg.LOGGER_TOPIC:
+        if not isinstance(message, GatewayData):
+            message = GatewayData.from_json(message.decode())
+        if message.tags is None:
+            # Without the gateway's order the yaw columns cannot be matched
             return
-        payload = message.payload.decode()
-        data = ClassifyingData.from_json(payload)
-        self._parse(data)
+        for tag in message.sensor_tags:
+            self.latest[message.session, message.tags.index(tag.address)] = (
+                *tag.gyroscope,
+                *tag.accelerometer,
+                *tag.magnetometer,
+            )
 
     def _parse(self, data: ClassifyingData):
-        _save_csv(data.data, self.path)
-        print(data.data)
+        now = time.time()
+        start = time.perf_counter()
+        if self.latest is None:
+            self.writer.write_row(now, data.data)
+        else:
+            raw = [
+                self.latest.get((data.session, tag), NO_RAW)
+                for tag in range(len(data.data))
+            ]
+            self.writer.write_row(now, data.data, raw)
+        self.write_time.record(time.perf_counter() - start)
+        self.rows += 1
+        self.rows_total.inc()
+        if self.status_interval and now - self.status_at >= self.status_interval:
+            self.status_at = now
+            print(f"\r{self.rows} rows, latest {data.data}", end="", flush=True)
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,188 @@
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Histogram:
+    """
+    Log bucketed histogram, recording a value is O(1) and percentiles are
+    accurate to the bucket width (about 12% with the default 20 buckets per
+    decade). Values at or below low, including negative ones, share the
+    first bucket.
+    """
+
+    def __init__(
+        self, low: float = 1e-4, high: float = 100.0, buckets_per_decade: int = 20
+    ):
+        self.low = low
+        self.buckets_per_decade = buckets_per_decade
+        size = math.ceil(math.log10(high / low) * buckets_per_decade) + 2
+        self.counts = [0] * size
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, value: float):
+        if value <= self.low:
+            bucket = 0
+        else:
+            bucket = int(math.log10(value / self.low) * self.buckets_per_decade) + 1
+            bucket = min(bucket, len(self.counts) - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, percent: float) -> float or None:
+        """Upper bound of the bucket holding the given percentile"""
+        if self.count == 0:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        return self.low * 10 ** (bucket / self.buckets_per_decade)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class Counter:
+    """A count that only goes up, incrementing is a single addition"""
+
+    __slots__ = ["value"]
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class Gauge:
+    """A value read from function whenever the metrics are collected"""
+
+    def __init__(self, function):
+        self.function = function
+
+    @property
+    def value(self):
+        return self.function()
+
+
+class Registry:
+    """
+    Named metrics, optionally labelled. Asking for a metric that exists returns
+    it, so components look their metrics up once and keep them.
+    """
+
+    def __init__(self):
+        self.metrics = dict[tuple, Counter or Gauge or Histogram]()
+
+    def _get(self, name: str, labels: dict, make):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            metric = self.metrics[key] = make()
+        return metric
+
+    def register(self, name: str, metric, **labels):
+        """Adds a metric made elsewhere, replacing any with the same name and labels"""
+        self.metrics[(name, tuple(sorted(labels.items())))] = metric
+        return metric
+
+    def counter(self, name: str, **labels) -> Counter:
+        return self._get(name, labels, Counter)
+
+    def gauge(self, name: str, function, **labels) -> Gauge:
+        """Registers function, replacing the one registered before"""
+        gauge = self._get(name, labels, lambda: Gauge(function))
+        gauge.function = function
+        return gauge
+
+    def histogram(
+        self, name: str, low: float = 1e-6, high: float = 10.0, **labels
+    ) -> Histogram:
+        """Histogram of seconds by default, from 1 us to 10 s"""
+        return self._get(name, labels, lambda: Histogram(low, high))
+
+    def snapshot(self) -> dict:
+        """Every metric by name and labels, histograms as their summaries"""
+        snapshot = dict()
+        for (name, labels), metric in self.metrics.items():
+            key = name + _format_labels(labels)
+            if isinstance(metric, Histogram):
+                snapshot[key] = metric.summary()
+            else:
+                snapshot[key] = metric.value
+        return snapshot
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text format, histograms as summaries"""
+        lines = []
+        for (name, labels), metric in sorted(self.metrics.items()):
+            if not isinstance(metric, Histogram):
+                lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+                continue
+            for quantile in [50, 95, 99]:
+                quantile_labels = labels + (("quantile", quantile / 100),)
+                value = metric.percentile(quantile)
+                value = "NaN" if value is None else value
+                lines.append(f"{name}{_format_labels(quantile_labels)} {value}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {metric.total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+# Shared by every component of a process
+REGISTRY = Registry()
+
+
+def serve(port: int, registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serves the metrics as text on http://localhost:port/metrics from a thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def publish_periodically(
+    transport, topic: str, interval: float, registry: Registry = REGISTRY
+) -> threading.Thread:
+    """Publishes a JSON snapshot of the metrics on topic every interval seconds"""
+
+    def publish():
+        while True:
+            time.sleep(interval)
+            snapshot = {"time": time.time(), "metrics": registry.snapshot()}
+            transport.publish(topic, json.dumps(snapshot).encode())
+
+    thread = threading.Thread(target=publish, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,75 @@
+import marshal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+
+def _label(code) -> tuple[str, int, str]:
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread each interval seconds from a background
+    thread, so threads started by paho and the pipeline are covered and the
+    profiled code runs at full speed in between. The result is written in the
+    pstats format, with times estimated from the sample counts, so it can be
+    read with python -m pstats or snakeviz like a cProfile output.
+    """
+
+    def __init__(self, path: Path, interval: float = 0.005):
+        self.path = Path(path)
+        self.interval = interval
+        self.own = Counter()
+        self.total = Counter()
+        self.callers = Counter()
+        self.running = False
+        self.thread: threading.Thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+
+    def _sample(self):
+        ident = threading.get_ident()
+        while self.running:
+            time.sleep(self.interval)
+            for thread, frame in sys._current_frames().items():
+                if thread == ident:
+                    continue
+                self.own[_label(frame.f_code)] += 1
+                seen = set()
+                callee = None
+                while frame is not None:
+                    function = _label(frame.f_code)
+                    # Recursive functions count once per sample
+                    if function not in seen:
+                        seen.add(function)
+                        self.total[function] += 1
+                    if callee is not None:
+                        self.callers[callee, function] += 1
+                    callee = function
+                    frame = frame.f_back
+
+    def stop(self):
+        """Stops sampling and writes the profile"""
+        self.running = False
+        self.thread.join()
+        callers = dict()
+        for (callee, caller), count in self.callers.items():
+            seconds = count * self.interval
+            callers.setdefault(callee, dict())[caller] = (count, count, 0.0, seconds)
+        stats = {
+            function: (
+                count,
+                count,
+                self.own[function] * self.interval,
+                count * self.interval,
+                callers.get(function, dict()),
+            )
+            for function, count in self.total.items()
+        }
+        self.path.write_bytes(marshal.dumps(stats))
@@ -0,0 +1,212 @@
+import json
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from paho.mqtt.client import Client
+from up_goer.cfg import cfg
+from up_goer.computer.computer import BankFilters, Filters, ScalarFilters
+from up_goer.core import wire
+from up_goer.logger.logger import format_csv
+
+# Recordings start with MAGIC, then each payload as it was received, JSON or
+# binary, after its length. Older recordings are JSON payloads, one per line.
+MAGIC = b"UGREC1\n"
+LENGTH = struct.Struct("<I")
+
+
+class Recorder:
+    """Appends every gateway frame to a file, as the raw payload."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists() and path.stat().st_size:
+            with open(path, "rb") as file:
+                if file.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} is an older recording, use a new file")
+        self.file = open(path, mode="ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.gateway_subscriber = Client()
+        self.gateway_subscriber.on_connect = self.on_connect
+        self.gateway_subscriber.on_message = self.on_message
+        self.gateway_subscriber.connect(cfg.GATEWAY_HOST)
+
+    def on_connect(self, client: Client, userdata, flags, result_code):
+        if client is not self.gateway_subscriber:
+            return
+        client.subscribe(cfg.GATEWAY_TOPIC)
+
+    def on_message(self, client: Client, userdata, message):
+        if client is not self.gateway_subscriber:
+            return
+        if message.topic != cfg.GATEWAY_TOPIC:
+            return
+        self.file.write(LENGTH.pack(len(message.payload)) + message.payload)
+
+
+def read_payloads(path: Path):
+    """Yields the payloads of a recording, in the order they were received"""
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            file.seek(0)
+            for line in file:
+                if line.strip():
+                    yield line
+            return
+        while len(header := file.read(LENGTH.size)) == LENGTH.size:
+            (length,) = LENGTH.unpack(header)
+            payload = file.read(length)
+            # The last payload is cut short if the recorder was killed
+            if len(payload) < length:
+                return
+            yield payload
+
+
+def _read_frame(payload: bytes):
+    """
+    Decodes a recorded GatewayData payload without going through dataclasses_json,
+    binary frames key their tags as the computer does, by address when they
+    carry the gateway's and by index otherwise
+    """
+    if wire.is_binary(payload):
+        frame = wire.decode(payload)
+        offsets = frame.records["offset"].astype(np.float64)
+        keys, missing = wire.tag_keys(frame)
+        return (
+            keys,
+            frame.records["axes"],
+            (frame.timestamp + offsets).tolist(),
+            frame.tags,
+            missing,
+            frame.session,
+        )
+    frame = json.loads(payload)
+    sensor_tags = frame["sensor_tags"]
+    keys = [tag["address"] for tag in sensor_tags]
+    values = [
+        (
+            tag["gyroscope"]["x"],
+            tag["gyroscope"]["y"],
+            tag["gyroscope"]["z"],
+            tag["accelerometer"]["x"],
+            tag["accelerometer"]["y"],
+            tag["accelerometer"]["z"],
+            tag["magnetometer"]["x"],
+            tag["magnetometer"]["y"],
+            tag["magnetometer"]["z"],
+        )
+        for tag in sensor_tags
+    ]
+    timestamps = [tag["timestamp"] for tag in sensor_tags]
+    return (
+        keys,
+        values,
+        timestamps,
+        frame.get("tags"),
+        frame.get("missing"),
+        frame.get("session"),
+    )
+
+
+def session_path(destination: Path, session: str or None) -> Path:
+    """destination for frames without a session, <stem>.<session><suffix> otherwise"""
+    if session is None:
+        return destination
+    name = "".join(c if c.isalnum() or c in "-_" else "_" for c in session)
+    return destination.with_name(f"{destination.stem}.{name}{destination.suffix}")
+
+
+def replay_file(
+    source: Path,
+    destination: Path,
+    sample_period: float,
+    beta: float,
+    chunk_size: int,
+    bank: bool,
+    variable_dt: bool,
+) -> dict[Path, int]:
+    """
+    Runs a recorded gateway stream through the AHRS and writes the yaws in the
+    Logger's CSV format, timestamped with the recorded frame time. Each session
+    has its own filters and file, as on the computer. Returns the number of
+    rows written per file.
+    """
+    filters_class = BankFilters if bank else ScalarFilters
+    sessions: dict[str or None, Filters] = dict()
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    files = dict()
+    rows = dict()
+    payloads = read_payloads(source)
+    try:
+        while True:
+            chunk = list(islice(payloads, chunk_size))
+            if not chunk:
+                break
+            output = dict[str or None, list[str]]()
+            for payload in chunk:
+                keys, values, timestamps, tags, missing, session = _read_frame(payload)
+                filters = sessions.get(session)
+                if filters is None:
+                    filters = filters_class(sample_period, beta, variable_dt)
+                    sessions[session] = filters
+                # the gateway's tag order, as Computer keeps it
+                if tags is not None:
+                    filters.announce(tags)
+                elif wire.is_binary(payload) and keys:
+                    filters.register(range(max(keys) + 1))
+                yaws = filters.process(keys, values, timestamps, missing)
+                if yaws is None:
+                    continue
+                output.setdefault(session, []).append(format_csv(max(timestamps), yaws))
+            for session, lines in output.items():
+                path = session_path(destination, session)
+                if path not in files:
+                    files[path] = open(path, "w")
+                    rows[path] = 0
+                files[path].writelines(lines)
+                rows[path] += len(lines)
+    finally:
+        for file in files.values():
+            file.close()
+    return rows
+
+
+class Replayer:
+    def __init__(
+        self,
+        sample_period: float = None,
+        beta: float = None,
+        chunk_size: int = 4096,
+        bank: bool = False,
+        variable_dt: bool = True,
+    ):
+        """sample_period and beta default to the SAMPLE_PERIOD and BETA settings"""
+        self.sample_period = sample_period or cfg.SAMPLE_PERIOD
+        self.beta = cfg.BETA if beta is None else beta
+        self.chunk_size = chunk_size
+        self.bank = bank
+        self.variable_dt = variable_dt
+
+    def run(self, sources: list[Path], output: Path, workers: int = 1):
+        """Replays each source into output/<name>.csv, one file per worker process"""
+        destinations = [output / f"{source.stem}.csv" for source in sources]
+        args = (
+            sources,
+            destinations,
+            [self.sample_period] * len(sources),
+            [self.beta] * len(sources),
+            [self.chunk_size] * len(sources),
+            [self.bank] * len(sources),
+            [self.variable_dt] * len(sources),
+        )
+        if workers > 1 and len(sources) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(replay_file, *args))
+        else:
+            results = list(map(replay_file, *args))
+        for rows in results:
+            for destination, count in rows.items():
+                print(f"Wrote {count} rows to {destination}")
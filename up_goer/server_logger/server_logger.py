@@ -1,14 +1,104 @@
-import os
-from pathlib import Path
+import time
+from collections import OrderedDict
 
-import arrow
 from paho.mqtt.client import Client
 from up_goer.cfg import cfg
-from up_goer.core.data_structures import PredictingData
+from up_goer.core.data_structures import ClassifyingData, PredictingData
+from up_goer.metrics.metrics import REGISTRY, Histogram
+
+# Stages between consecutive points of a ClassifyingData trace and the prediction
+STAGES = ["gateway", "gateway_to_computer", "computer", "server", "total"]
+
+
+class CorrelationCache:
+    """
+    Sent ClassifyingData by id, waiting for their prediction, oldest first.
+    Entries are evicted once there are more than max_size or they are older
+    than max_age, those predictions count as lost. A prediction arriving more
+    than stale_after seconds after its data was sent is expired and dropped.
+    """
+
+    def __init__(
+        self, max_size: int = 10000, max_age: float = 30.0, stale_after: float = 2.0
+    ):
+        self.entries = OrderedDict[str, tuple[float, list[float] or None]]()
+        self.max_size = max_size
+        self.max_age = max_age
+        self.stale_after = stale_after
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.lost = 0
+        self.rtt = Histogram()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def put(self, id: str, sent: float, trace: list[float] = None):
+        self.entries[id] = (sent, trace)
+        self.evict(sent)
+
+    def evict(self, now: float):
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.lost += 1
+        while self.entries:
+            sent, _ = next(iter(self.entries.values()))
+            if now - sent <= self.max_age:
+                break
+            self.entries.popitem(last=False)
+            self.lost += 1
+
+    def resolve(self, id: str, received: float) -> tuple[str, list[float] or None]:
+        """
+        Pairs a prediction with its data. Returns "hit" with the data's trace,
+        "miss" for unknown ids and "expired" for stale predictions
+        """
+        entry = self.entries.pop(id, None)
+        if entry is None:
+            self.misses += 1
+            return "miss", None
+        sent, trace = entry
+        self.rtt.record(received - sent)
+        if received - sent > self.stale_after:
+            self.expired += 1
+            return "expired", trace
+        self.hits += 1
+        return "hit", trace
+
+    def summary(self) -> dict:
+        return {
+            "pending": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "lost": self.lost,
+            "rtt": self.rtt.summary(),
+        }
 
 
 class ServerLogger:
-    def __init__(self):
+    def __init__(
+        self,
+        report_interval: float = 10.0,
+        max_pending: int = 10000,
+        max_age: float = 30.0,
+        stale_after: float = 2.0,
+    ):
+        self.pending = CorrelationCache(max_pending, max_age, stale_after)
+        self.histograms = {stage: Histogram() for stage in STAGES}
+        for stage, histogram in self.histograms.items():
+            REGISTRY.register("server_logger_stage_seconds", histogram, stage=stage)
+        REGISTRY.register("server_logger_rtt_seconds", self.pending.rtt)
+        for outcome in ["hits", "misses", "expired", "lost"]:
+            REGISTRY.gauge(
+                f"server_logger_{outcome}_total",
+                lambda outcome=outcome: getattr(self.pending, outcome),
+            )
+        REGISTRY.gauge("server_logger_pending", lambda: len(self.pending))
+        self.report_interval = report_interval
+        self.reported_at = time.time()
+
         self.server_subscriber = Client()
         self.server_subscriber.on_connect = self.on_connect
         self.server_subscriber.on_message = self.on_message
@@ -20,15 +110,72 @@ class ServerLogger:
         if client is not self.server_subscriber:
             return
         client.subscribe(cfg.PREDICT_TOPIC)
+        client.subscribe(cfg.CLASSIFY_TOPIC)
 
     def on_message(self, client: Client, userdata, message):
         if client is not self.server_subscriber:
             return
+        received = time.time()
+        if message.topic == cfg.CLASSIFY_TOPIC:
+            data = ClassifyingData.from_json(message.payload.decode())
+            self._track(data, received)
+            return
         if message.topic != cfg.PREDICT_TOPIC:
             return
         payload = message.payload.decode()
         data = PredictingData.from_json(payload)
-        self._parse(data)
+        self._parse(data, received)
+
+    def _track(self, data: ClassifyingData, received: float):
+        # Sent as far as this observer's clock goes, so the RTT needs no clock sync
+        self.pending.put(str(data.id), received, data.trace)
+        # Data keeps flowing while the server is silent, so its losses are reported
+        self._report_due(received)
+
+    def _parse(self, data: PredictingData, received: float):
+        status, trace = self.pending.resolve(data.id, received)
+        if status == "hit":
+            # Stale predictions are dropped so outdated posture is never shown,
+            # and so are unknown ones, whose data may have been evicted for age
+            print(data)
+        if trace is not None:
+            sample, gateway_published, computer_received, computer_published = trace
+            if gateway_published is not None:
+                self.histograms["gateway"].record(gateway_published - sample)
+                self.histograms["gateway_to_computer"].record(
+                    computer_received - gateway_published
+                )
+            self.histograms["computer"].record(computer_published - computer_received)
+            self.histograms["server"].record(received - computer_published)
+            self.histograms["total"].record(received - sample)
+        self._report_due(received)
+
+    def _report_due(self, now: float):
+        if now - self.reported_at >= self.report_interval:
+            self.reported_at = now
+            self.pending.evict(now)
+            self.report()
 
-    def _parse(self, data: PredictingData):
-        print(data)
+    def report(self):
+        """
+        Prints per stage latency percentiles in ms, clocks are assumed in sync,
+        then the correlation counters and round trip times
+        """
+        for stage, histogram in self.histograms.items():
+            summary = histogram.summary()
+            if not summary["count"]:
+                continue
+            print(
+                f"[latency] {stage}: n={summary['count']} "
+                f"p50={summary['p50'] * 1000:.1f}ms "
+                f"p95={summary['p95'] * 1000:.1f}ms "
+                f"p99={summary['p99'] * 1000:.1f}ms"
+            )
+        summary = self.pending.summary()
+        rtt = summary.pop("rtt")
+        counters = " ".join(f"{name}={value}" for name, value in summary.items())
+        if rtt["count"]:
+            counters += (
+                f" rtt_p50={rtt['p50'] * 1000:.1f}ms rtt_p99={rtt['p99'] * 1000:.1f}ms"
+            )
+        print(f"[correlation] {counters}")
@@ -0,0 +1,258 @@
+import asyncio
+import math
+import random
+import struct
+import time
+
+from up_goer.cc2650.cc2650 import MovementDecoder, MovementSensorMPU9250
+from up_goer.transport.transport import Transport
+
+# Earth's field in uT as north, east and down components, roughly mid latitude
+EARTH_FIELD = (20.0, 0.0, 45.0)
+
+
+def _to_body(vector: tuple, roll: float, pitch: float, yaw: float) -> tuple:
+    """Rotates a world vector into the frame of a tag at the given angles in radians"""
+    x, y, z = vector
+    x, y = (
+        x * math.cos(yaw) + y * math.sin(yaw),
+        -x * math.sin(yaw) + y * math.cos(yaw),
+    )
+    x, z = (
+        x * math.cos(pitch) - z * math.sin(pitch),
+        x * math.sin(pitch) + z * math.cos(pitch),
+    )
+    y, z = (
+        y * math.cos(roll) + z * math.sin(roll),
+        -y * math.sin(roll) + z * math.cos(roll),
+    )
+    return x, y, z
+
+
+def sway(phase: float = 0.0):
+    """Scripted motion of someone leaning and turning slowly in their chair"""
+
+    def motion(t: float) -> tuple[float, float, float]:
+        return (
+            5 * math.sin(2 * math.pi * t / 13 + phase),
+            15 * math.sin(2 * math.pi * t / 20 + phase),
+            30 * math.sin(2 * math.pi * t / 60 + phase),
+        )
+
+    return motion
+
+
+def random_walk(seed: int = None, step: float = 2.0, pull: float = 0.02):
+    """Random motion in degrees, pulled back towards upright so it stays plausible"""
+    rng = random.Random(seed)
+    angles = [0.0, 0.0, 0.0]
+    at = [0.0]
+
+    def motion(t: float) -> tuple[float, float, float]:
+        dt = max(t - at[0], 0.0)
+        at[0] = t
+        for i in range(3):
+            angles[i] += rng.gauss(0, step * math.sqrt(dt)) - pull * angles[i] * dt
+        return tuple(angles)
+
+    return motion
+
+
+MOTIONS = {"sway": sway, "random": random_walk}
+
+
+class SimulatedClient:
+    """
+    Stands in for a BleakClient connected to a CC2650, with the parts of its
+    API that Gateway.connect and MovementSensorMPU9250.start_listener use.
+    Once notifications are started it sends packed MPU9250 readings of a tag
+    following motion(t), at the period written to the rate characteristic.
+    Each period is stretched by up to jitter of itself, a notification is lost
+    with probability drop, and the link drops after exponentially distributed
+    times with mean disconnect_every seconds.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        motion=None,
+        jitter: float = 0.0,
+        drop: float = 0.0,
+        disconnect_every: float = None,
+        noise: float = 0.01,
+        seed: int = None,
+    ):
+        self.address = address
+        self.motion = motion or sway()
+        self.jitter = jitter
+        self.drop = drop
+        self.disconnect_every = disconnect_every
+        self.noise = noise
+        self.rng = random.Random(seed)
+        self.scale = MovementDecoder().scale
+        self.period = 1.0
+        # Angles of the previous reading and its time, for the gyroscope
+        self.last = None
+        self.connected = False
+        self.task: asyncio.Task = None
+        self.sent = 0
+        self.dropped = 0
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.disconnect()
+
+    async def connect(self):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def is_connected(self) -> bool:
+        return self.connected
+
+    async def write_gatt_char(self, uuid: str, data: bytes, response: bool = False):
+        if uuid == MovementSensorMPU9250.RATE_UUID:
+            (rate,) = struct.unpack("<H", data)
+            self.period = rate / 100
+
+    async def start_notify(self, uuid: str, callback):
+        self.task = asyncio.ensure_future(self._notify(callback))
+
+    def reading(self, t: float) -> bytes:
+        """A notification for time t, gyroscope from the motion since the last one"""
+        now = [math.radians(angle) for angle in self.motion(t)]
+        gyro = [0.0, 0.0, 0.0]
+        if self.last is not None and t > self.last[1]:
+            before, at = self.last
+            gyro = [(a - b) / (t - at) for a, b in zip(now, before)]
+        self.last = (now, t)
+        accel = _to_body((0.0, 0.0, 1.0), *now)
+        mag = _to_body(EARTH_FIELD, *now)
+        values = []
+        for value, scale in zip((*gyro, *accel, *mag), self.scale):
+            value += self.rng.gauss(0, self.noise * abs(value) + 1e-3)
+            values.append(max(-32768, min(32767, round(value / scale))))
+        return MovementDecoder.STRUCT.pack(*values)
+
+    async def _notify(self, callback):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        disconnect_at = None
+        if self.disconnect_every:
+            disconnect_at = start + self.rng.expovariate(1 / self.disconnect_every)
+        # Scheduled from the start, so time spent in callbacks does not add up
+        notify_at = start
+        while self.connected:
+            notify_at += self.period * (1 + self.rng.uniform(0, self.jitter))
+            await asyncio.sleep(max(notify_at - loop.time(), 0))
+            if disconnect_at is not None and loop.time() >= disconnect_at:
+                self.connected = False
+                return
+            if self.rng.random() < self.drop:
+                self.dropped += 1
+                continue
+            self.sent += 1
+            callback(0, bytearray(self.reading(loop.time() - start)))
+
+
+class Simulator:
+    """Makes a SimulatedClient per address, to pass to Gateway as client_class"""
+
+    def __init__(
+        self,
+        motion: str = "sway",
+        jitter: float = 0.0,
+        drop: float = 0.0,
+        disconnect_every: float = None,
+        seed: int = None,
+    ):
+        if motion not in MOTIONS:
+            raise ValueError(f"Unknown motion: {motion}")
+        self.motion = motion
+        self.jitter = jitter
+        self.drop = drop
+        self.disconnect_every = disconnect_every
+        self.rng = random.Random(seed)
+        self.clients = list[SimulatedClient]()
+
+    def __call__(self, address: str) -> SimulatedClient:
+        seed = self.rng.getrandbits(32)
+        motion = sway(seed % 360) if self.motion == "sway" else random_walk(seed)
+        client = SimulatedClient(
+            address, motion, self.jitter, self.drop, self.disconnect_every, seed=seed
+        )
+        self.clients.append(client)
+        return client
+
+    @property
+    def sent(self) -> int:
+        return sum(client.sent for client in self.clients)
+
+    @property
+    def dropped(self) -> int:
+        return sum(client.dropped for client in self.clients)
+
+
+class CountingTransport(Transport):
+    """Counts what would have been published, to load test without a broker"""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def publish(self, topic: str, message: bytes):
+        self.messages += 1
+        self.bytes += len(message)
+
+    def subscribe(self, topic: str, callback):
+        pass
+
+
+async def _simulate(gateway, simulator: Simulator, duration: float, interval: float):
+    main = asyncio.ensure_future(gateway.main())
+    start = time.perf_counter()
+    reported = (start, 0, 0)
+    while time.perf_counter() < start + duration:
+        await asyncio.sleep(min(interval, start + duration - time.perf_counter()))
+        now = time.perf_counter()
+        at, sent, published = reported
+        reported = (now, simulator.sent, gateway.samples_published)
+        print(
+            f"[simulate] notifications/s={(simulator.sent - sent) / (now - at):.0f} "
+            f"samples/s={(gateway.samples_published - published) / (now - at):.0f} "
+            f"queued={gateway.queue.qsize()}"
+        )
+    main.cancel()
+    try:
+        await main
+    except asyncio.CancelledError:
+        pass
+    return time.perf_counter() - start
+
+
+def simulate(gateway, simulator: Simulator, duration: float, interval: float = 1.0):
+    """
+    Runs a gateway made with simulator as its client_class for duration seconds,
+    printing rates every interval, and returns its sustained throughput
+    """
+    elapsed = asyncio.run(_simulate(gateway, simulator, duration, interval))
+    summary = {
+        "tags": len(gateway.sensor_tags),
+        "seconds": elapsed,
+        "notifications_per_s": simulator.sent / elapsed,
+        "samples_per_s": gateway.samples_published / elapsed,
+        "dropped": simulator.dropped,
+        "reconnects": sum(link.reconnects for link in gateway.links.values()),
+    }
+    transport = gateway.computer_publisher
+    if isinstance(transport, CountingTransport):
+        summary["messages_per_s"] = transport.messages / elapsed
+        summary["bytes_per_s"] = transport.bytes / elapsed
+    return summary
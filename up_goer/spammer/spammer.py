@@ -1,28 +1,100 @@
-import os
+import time
 from pathlib import Path
-from time import sleep
 
-import arrow
-from paho.mqtt.client import Client
+from paho.mqtt.client import MQTT_ERR_SUCCESS, Client
 from up_goer.cfg import cfg
-from up_goer.core.data_structures import ClassifyingData, PredictingData
+from up_goer.core.data_structures import ClassifyingData
+
+
+def _read_rows(path: Path):
+    """Yields (timestamp, yaws) from a Logger CSV, skipping rows with missing tags"""
+    with open(path, "r") as file:
+        for line in file:
+            fields = line.strip().split(",")
+            if not line.strip() or "" in fields:
+                continue
+            values = [float(value) for value in fields]
+            yield values[0], values[1:]
+
+
+def _encode(yaws: list[float]) -> bytes:
+    return ClassifyingData(yaws).to_json().encode()
 
 
 class Spammer:
-    def __init__(self):
+    def __init__(self, qos: int = 0, window: int = 100):
+        self.qos = qos
+        # Most messages handed to paho but not yet written out or acknowledged
+        self.window = window
+        self.sent = 0
+        self.published = 0
+        self.dropped = 0
         self.publisher = Client()
+        self.publisher.on_publish = self.on_publish
+        self.publisher.max_inflight_messages_set(window)
         self.publisher.username_pw_set(cfg.USER, cfg.PASSWORD)
         self.publisher.connect(cfg.HOST)
+        self.publisher.loop_start()
+
+    def on_publish(self, client: Client, userdata, mid):
+        self.published += 1
+
+    def blast(
+        self,
+        path: Path,
+        rate: float or None = 10.0,
+        speed: float or None = None,
+        bulk: bool = False,
+    ):
+        """
+        Publishes every row of a Logger CSV to the classify topic.
+
+        @param rate: Messages per second, None to publish as fast as possible.
+        @param speed: Replays at this multiple of the recorded timestamps
+            instead of a fixed rate.
+        @param bulk: Parses and encodes the whole file before sending starts.
+        """
+        rows = _read_rows(path)
+        if bulk:
+            rows = [(timestamp, _encode(yaws)) for timestamp, yaws in rows]
+        else:
+            rows = ((timestamp, _encode(yaws)) for timestamp, yaws in rows)
+
+        start = time.perf_counter()
+        origin = None
+        for i, (timestamp, payload) in enumerate(rows):
+            if origin is None:
+                origin = timestamp
+            if speed:
+                due = start + (timestamp - origin) / speed
+            elif rate:
+                due = start + i / rate
+            else:
+                due = start
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            while self.sent - self.published - self.dropped >= self.window:
+                time.sleep(0.0005)
+            self._send(payload)
+        self._report(start)
+
+    def _send(self, payload: bytes):
+        self.sent += 1
+        info = self.publisher.publish(cfg.CLASSIFY_TOPIC, payload, self.qos)
+        if info.rc != MQTT_ERR_SUCCESS:
+            self.dropped += 1
 
-    def blast(self, path: Path):
-        with open(path, "r") as file:
-            for line in file:
-                data = line.split(",")
-                data = ClassifyingData(data[1:4])
-                self._send(data)
-
-    def _send(self, data: ClassifyingData):
-        print("sent", data)
-        data = data.to_json().encode()
-        self.publisher.publish(cfg.CLASSIFY_TOPIC, payload=data)
-        sleep(0.1)
+    def _report(self, start: float, timeout: float = 10.0):
+        deadline = time.perf_counter() + timeout
+        while (
+            self.sent - self.published - self.dropped > 0
+            and time.perf_counter() < deadline
+        ):
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        self.publisher.loop_stop()
+        print(
+            f"sent {self.sent}, published {self.published}, dropped {self.dropped} "
+            f"in {elapsed:.2f}s ({self.published / elapsed:.1f} msg/s)"
+        )
@@ -0,0 +1,164 @@
+"""
+Columnar log store
+------------------
+
+Append-only segment files of fixed-width little endian records, memory mapped on read.
+
+Segment header (16 bytes):
+ - magic: b"UGLS"
+ - version: uint8
+ - flags: uint8, bit 0 set when records carry raw sensor data
+ - tags: uint16, number of tags per record
+ - reserved: 8 bytes
+
+Record:
+ - timestamp: float64
+ - yaw: tags x float32
+ - raw: tags x 9 x float32, gyroscope, accelerometer and magnetometer x, y, z,
+   only when the raw flag is set
+"""
+
+import math
+import struct
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b"UGLS"
+VERSION = 1
+FLAG_RAW = 1
+
+HEADER = struct.Struct("<4sBBH8x")
+SEGMENT_GLOB = "segment-*.ugl"
+
+
+def record_dtype(tags: int, raw: bool = False) -> np.dtype:
+    fields = [("timestamp", "<f8"), ("yaw", "<f4", (tags,))]
+    if raw:
+        fields.append(("raw", "<f4", (tags, 9)))
+    return np.dtype(fields)
+
+
+class StoreWriter:
+    """
+    Appends records to segment files in a directory, starting a new segment
+    every segment_records records or whenever the record layout changes.
+    """
+
+    def __init__(self, directory: Path, segment_records: int = 1 << 20):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # After the highest existing segment, there may be gaps below it
+        self.segment = 1 + max(
+            (
+                int(path.stem.partition("-")[2])
+                for path in self.directory.glob(SEGMENT_GLOB)
+            ),
+            default=-1,
+        )
+        self.file = None
+        self.tags = None
+        self.raw = None
+        self.records = 0
+
+    def _open(self, tags: int, raw: bool):
+        self.close()
+        self.tags = tags
+        self.raw = raw
+        # Same layout as record_dtype, packed without going through NumPy
+        self.record = struct.Struct(f"<d{tags}f{tags * 9 if raw else 0}f")
+        while True:
+            path = self.directory / f"segment-{self.segment:06d}.ugl"
+            self.segment += 1
+            try:
+                # Never truncates a segment written since, by another writer
+                self.file = open(path, "xb")
+                break
+            except FileExistsError:
+                pass
+        self.file.write(HEADER.pack(MAGIC, VERSION, FLAG_RAW if raw else 0, tags))
+        self.records = 0
+
+    def write(self, timestamp: float, yaws, raw=None):
+        """Appends one record, raw is an optional (tags, 9) array of sensor data"""
+        if (
+            self.file is None
+            or self.records >= self.segment_records
+            or self.tags != len(yaws)
+            or self.raw != (raw is not None)
+        ):
+            self._open(len(yaws), raw is not None)
+        if raw is None:
+            self.file.write(self.record.pack(timestamp, *yaws))
+        else:
+            raw = np.asarray(raw, dtype=np.float64).ravel()
+            self.file.write(self.record.pack(timestamp, *yaws, *raw))
+        self.records += 1
+
+    def write_row(self, timestamp: float, data: list[float], raw=None):
+        # Missing yaws are stored as NaN
+        self.write(timestamp, [math.nan if yaw is None else yaw for yaw in data], raw)
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def open_segment(path: Path) -> np.ndarray:
+    """Memory maps a segment as a read-only structured array of records"""
+    with open(path, "rb") as file:
+        magic, version, flags, tags = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"Not a log store segment: {path}")
+    if version != VERSION:
+        raise ValueError(f"Unsupported log store version {version}: {path}")
+    dtype = record_dtype(tags, bool(flags & FLAG_RAW))
+    # A record cut short by a crash is ignored
+    count = (path.stat().st_size - HEADER.size) // dtype.itemsize
+    if count == 0:
+        return np.empty(0, dtype)
+    return np.memmap(path, dtype, mode="r", offset=HEADER.size, shape=(count,))
+
+
+class StoreReader:
+    """
+    Opens every segment of a store without reading it. Fields are exposed as
+    NumPy views, e.g. reader.segments[0]["yaw"][:, 1] for the second tag.
+    """
+
+    def __init__(self, directory: Path):
+        self.paths = sorted(directory.glob(SEGMENT_GLOB))
+        self.segments = [open_segment(path) for path in self.paths]
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    def field(self, name: str) -> np.ndarray:
+        """Concatenates one field over every segment, this copies"""
+        return np.concatenate([segment[name] for segment in self.segments])
+
+
+def convert_csv(source: Path, directory: Path) -> int:
+    """Converts a Logger CSV into a store, returns the number of records written"""
+    writer = StoreWriter(directory)
+    rows = 0
+    with open(source, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            values = [
+                float(value) if value.strip() else math.nan for value in line.split(",")
+            ]
+            writer.write(values[0], values[1:])
+            rows += 1
+    writer.close()
+    return rows
@@ -0,0 +1,104 @@
+import asyncio
+
+from paho.mqtt.client import Client
+
+
+class Transport:
+    """
+    Moves messages between the gateway, computer and logger. Transports that
+    serialise take bytes, the others pass the data objects as they are.
+    """
+
+    serialises = True
+
+    def connect(self):
+        pass
+
+    def publish(self, topic: str, message):
+        raise NotImplementedError
+
+    def subscribe(self, topic: str, callback):
+        """Calls callback(message) for every message published to topic"""
+        raise NotImplementedError
+
+
+class MqttTransport(Transport):
+    """A paho client connected to one broker, the behaviour before transports"""
+
+    def __init__(
+        self,
+        host: str,
+        username: str = None,
+        password: str = None,
+        connect: bool = True,
+    ):
+        self.host = host
+        self.callbacks = dict[str, list]()
+        self.client = Client()
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        if username is not None:
+            self.client.username_pw_set(username, password)
+        if connect:
+            self.connect()
+
+    def connect(self):
+        self.client.connect(self.host)
+
+    def on_connect(self, client: Client, userdata, flags, result_code):
+        for topic in self.callbacks:
+            client.subscribe(topic)
+
+    def on_message(self, client: Client, userdata, message):
+        for callback in self.callbacks.get(message.topic, []):
+            callback(message.payload)
+
+    def publish(self, topic: str, message: bytes):
+        return self.client.publish(topic, message)
+
+    def subscribe(self, topic: str, callback):
+        self.callbacks.setdefault(topic, []).append(callback)
+
+    def loop_forever(self):
+        self.client.loop_forever()
+
+    def loop_start(self):
+        self.client.loop_start()
+
+
+class LocalTransport(Transport):
+    """
+    Passes data objects between components in the same event loop through
+    asyncio queues, without serialising them. Messages published before run
+    has started are dropped, as nothing is listening yet.
+    """
+
+    serialises = False
+
+    def __init__(self):
+        self.callbacks = dict[str, list]()
+        self.queues = None
+
+    def publish(self, topic: str, message):
+        if self.queues is None:
+            return
+        for queue in self.queues.get(topic, []):
+            queue.put_nowait(message)
+
+    def subscribe(self, topic: str, callback):
+        self.callbacks.setdefault(topic, []).append(callback)
+
+    async def _consume(self, queue: asyncio.Queue, callback):
+        while True:
+            callback(await queue.get())
+
+    async def run(self):
+        # Queues are created here so that they belong to the running event loop
+        self.queues = dict[str, list]()
+        consumers = []
+        for topic, callbacks in self.callbacks.items():
+            for callback in callbacks:
+                queue = asyncio.Queue()
+                self.queues.setdefault(topic, []).append(queue)
+                consumers.append(self._consume(queue, callback))
+        await asyncio.gather(*consumers)